@@ -0,0 +1,25 @@
+"""aggregate_data over one symbol's decoded ticks"""
+import pytest
+
+TIMEFRAMES = ["100t", "1000t", "1m", "15m", "1h", "1D", "500v", "20r"]
+
+
+@pytest.mark.parametrize("timeframe", TIMEFRAMES)
+def test_aggregate_data(benchmark, manager, ticks, timeframe):
+    bars = benchmark(manager.aggregate_data, ticks, timeframe)
+    assert len(bars)
+
+
+def test_streaming_aggregator(benchmark, manager, ticks):
+    """15m bars pushed one day of ticks at a time, like a chunked export"""
+    days = [day for _, day in ticks.groupby(ticks["TIME"].dt.floor("D"))]
+
+    def stream():
+        aggregator = manager.StreamingAggregator("15m", ticks["TIME"].iloc[0].floor("D"))
+        count = 0
+        for day in days:
+            bars = aggregator.push(day.reset_index(drop=True))
+            count += 0 if bars is None else len(bars)
+        return count + len(aggregator.flush())
+
+    assert benchmark(stream)
@@ -0,0 +1,40 @@
+"""Decoding and exporting downloaded hour files"""
+from pathlib import Path
+
+import pytest
+
+from conftest import END, START, SYMBOLS, _hour_of
+
+
+@pytest.fixture(scope="module")
+def hour_files(paths):
+    download_path, _ = paths
+    files = sorted(Path(f"{download_path}{SYMBOLS[0]}").rglob("*h_ticks.bi5"))
+    files = [file for file in files if file.stat().st_size]
+    return files, [_hour_of(file) for file in files]
+
+
+def test_decode_files(benchmark, manager, hour_files):
+    files, times = hour_files
+    hour_starts = manager.bi5.hour_ms(times)
+    columns = benchmark(manager.bi5.decode_files, files, hour_starts, show_progress=False)
+    assert len(columns["COUNT"]) == len(files)
+
+
+def test_decode_to_frame(benchmark, manager, hour_files):
+    """The export decode loop: decode a month chunk and build the tick frame"""
+    files, times = hour_files
+    chunk_files, chunk_times = manager._tick_chunks(files, times, "month")[0]
+
+    def decode():
+        columns = manager.bi5.decode_files(chunk_files, manager.bi5.hour_ms(chunk_times), show_progress=False)
+        return manager._ticks_frame(columns)
+
+    assert len(benchmark(decode))
+
+
+@pytest.mark.parametrize("timeframe,output_format", [("1t", "csv"), ("1t", "parquet"), ("15m", "csv")])
+def test_export(benchmark, manager, timeframe, output_format):
+    benchmark.pedantic(manager.export, args=([SYMBOLS[0]], timeframe, START),
+                       kwargs={"end": END, "mode": "full", "output_format": output_format},
+                       rounds=3, iterations=1)
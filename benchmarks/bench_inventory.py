@@ -0,0 +1,43 @@
+"""Finding downloaded assets and their hours.
+
+grab_asset_dirs walked the download tree on every call; the inventory
+replaced it, so the directory scan of reindex and the inventory queries
+that list, update and export make are measured instead.
+"""
+from pathlib import Path
+
+import pytest
+
+from conftest import SYMBOLS
+
+
+@pytest.fixture(scope="module")
+def inv(manager, paths):
+    download_path, _ = paths
+    manager.reindex(SYMBOLS, mode="full")
+    with manager.inventory.for_download_path(download_path) as inv:
+        yield inv
+
+
+def test_scan_hour_files(benchmark, manager, paths):
+    download_path, _ = paths
+    files = benchmark(manager._scan_hour_files, Path(f"{download_path}{SYMBOLS[0]}"))
+    assert len(files)
+
+
+def test_reindex(benchmark, manager):
+    benchmark.pedantic(manager.reindex, args=(SYMBOLS,), kwargs={"mode": "full"}, rounds=3, iterations=1)
+
+
+def test_inventory_symbols(benchmark, inv):
+    assert benchmark(inv.symbols) == sorted(SYMBOLS)
+
+
+def test_inventory_coverage(benchmark, inv):
+    assert len(benchmark(inv.coverage)) == len(SYMBOLS)
+
+
+def test_inventory_hours(benchmark, inv):
+    """The per-asset lookup export makes instead of stat'ing every hour"""
+    first, last = inv.coverage()[0]["first"], inv.coverage()[0]["last"]
+    assert len(benchmark(inv.hours, SYMBOLS[0], first, last))
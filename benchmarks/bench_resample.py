@@ -0,0 +1,21 @@
+"""Loading exported ticks and resampling them with main.py"""
+from conftest import SYMBOLS
+
+
+def test_get_price_df(benchmark, main_module, tick_exports):
+    """Read the 1t CSV and build 1-minute mid bars"""
+    ohlc = benchmark.pedantic(main_module.get_price_df, args=(SYMBOLS[0],), kwargs={"verbose": False, "mode": "full"},
+                              rounds=3, iterations=1)
+    assert len(ohlc)
+
+
+def test_resample_cascade(benchmark, main_module, tick_exports):
+    ohlc_1min = main_module.get_price_df(SYMBOLS[0], verbose=False, mode="full")
+    frames = benchmark(main_module.resample_cascade, ohlc_1min)
+    assert len(frames) == len(main_module.TIMEFRAMES)
+
+
+def test_resample_all_timeframes(benchmark, main_module, tick_exports):
+    """The main.py run: every symbol, all 11 timeframes, written as CSV"""
+    benchmark.pedantic(main_module.resample_symbols, args=(tick_exports,), kwargs={"mode": "full"},
+                       rounds=3, iterations=1)
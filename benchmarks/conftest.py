@@ -0,0 +1,104 @@
+"""Fixtures for the benchmarks: one synthetic data tree per session and the modules under test.
+
+The tree size is set with BENCH_SYMBOLS (space separated, default
+"EURUSD GBPUSD"), BENCH_START (default 2024-01-01), BENCH_DAYS (default 28)
+and BENCH_TICKS_PER_HOUR (default 1500).
+"""
+import importlib.util
+import os
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+BENCH_DIR = Path(__file__).parent
+ROOT = BENCH_DIR.parent
+MANAGER_DIR = ROOT / "dukascopy-data-manager"
+sys.path.insert(0, str(MANAGER_DIR))
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(BENCH_DIR))
+
+import synthetic
+
+SYMBOLS = os.environ.get("BENCH_SYMBOLS", "EURUSD GBPUSD").split()
+START = os.environ.get("BENCH_START", "2024-01-01")
+DAYS = int(os.environ.get("BENCH_DAYS", "28"))
+TICKS_PER_HOUR = int(os.environ.get("BENCH_TICKS_PER_HOUR", "1500"))
+END = (datetime.fromisoformat(START) + timedelta(days=DAYS)).strftime("%Y-%m-%d")
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_configure(config):
+    # Keep the JSON history next to the benchmarks wherever pytest is run from
+    if config.getoption("benchmark_storage", None) == "file://./.benchmarks":
+        config.option.benchmark_storage = f"file://{BENCH_DIR / '.benchmarks'}"
+
+
+def pytest_benchmark_update_json(config, benchmarks, output_json):
+    # Comparisons only use the statistics, and the per-round timings make up most of the file
+    for benchmark in output_json["benchmarks"]:
+        benchmark["stats"].pop("data", None)
+
+
+@pytest.fixture(scope="session")
+def data_dir(tmp_path_factory):
+    """DATA_DIR holding a synthetic download tree"""
+    data_dir = tmp_path_factory.mktemp("dukascopy")
+    os.environ["DATA_DIR"] = str(data_dir)
+    synthetic.generate(f"{data_dir}/dukascopy_live/download/", datetime.fromisoformat(START),
+                       datetime.fromisoformat(END), SYMBOLS, TICKS_PER_HOUR, gap_rate=0.002)
+    return data_dir
+
+
+def _import_path(name:str, path:Path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="session")
+def manager(data_dir):
+    """The dukascopy-data-manager CLI module, with progress bars off"""
+    module = _import_path("dukascopy_data_manager", MANAGER_DIR / "dukascopy-data-manager.py")
+    module.SHOW_PROGRESS = False
+    # Importing loads .env, which may point DATA_DIR elsewhere
+    os.environ["DATA_DIR"] = str(data_dir)
+    return module
+
+
+@pytest.fixture(scope="session")
+def main_module(manager, data_dir):
+    import main
+    os.environ["DATA_DIR"] = str(data_dir)
+    return main
+
+
+@pytest.fixture(scope="session")
+def paths(manager):
+    """(download_path, export_path) of the synthetic tree"""
+    return manager.get_paths("full")
+
+
+@pytest.fixture(scope="session")
+def tick_exports(manager):
+    """Export the 1t CSV of every symbol once, for the resampling benchmarks"""
+    manager.export(SYMBOLS, "1t", START, end=END, mode="full", output_format="csv")
+    return SYMBOLS
+
+
+@pytest.fixture(scope="session")
+def ticks(manager, paths):
+    """A decoded tick frame of the first symbol, like export passes to aggregate_data"""
+    download_path, _ = paths
+    files = sorted(Path(f"{download_path}{SYMBOLS[0]}").rglob("*h_ticks.bi5"))
+    files = [file for file in files if file.stat().st_size]
+    times = [_hour_of(file) for file in files]
+    columns = manager.bi5.decode_files(files, manager.bi5.hour_ms(times), show_progress=False)
+    return manager._ticks_frame(columns)
+
+
+def _hour_of(file:Path) -> datetime:
+    day_dir = file.parent
+    return datetime(int(day_dir.parent.parent.name), int(day_dir.parent.name) + 1, int(day_dir.name), int(file.name[:2]))
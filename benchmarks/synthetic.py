@@ -0,0 +1,115 @@
+"""Synthetic Dukascopy download trees for offline benchmarks.
+
+Writes LZMA compressed .bi5 hour files in the download_path layout
+({symbol}/{year}/{month-1:0>2}/{day:0>2}/{hour:0>2}h_ticks.bi5) with the
+big-endian TIME/ASKP/BIDP/ASKV/BIDV records of the real feed. Tick counts
+follow an intraday activity profile (quiet Asian session, busy London/New York
+overlap), prices are a random walk in points with a 1-3 point spread and
+volumes are lognormal in millions. Weekend hours are written as zero-byte
+files like the feed returns them (or left out), and a share of trading hours
+can be dropped to leave gaps.
+
+    python benchmarks/synthetic.py /tmp/bench/dukascopy_live/download --start 2024-01-01 --end 2024-02-01
+"""
+import argparse
+import lzma
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "dukascopy-data-manager"))
+from bi5 import TICK_DTYPE
+from trading_calendar import TradingCalendar
+
+POINT = 100_000
+HOUR = timedelta(hours=1)
+
+# Starting mid price of each symbol
+SYMBOLS = {
+    "EURUSD": 1.0850,
+    "GBPUSD": 1.2700,
+    "AUDUSD": 0.6550,
+    "NZDUSD": 0.6100,
+    "EURGBP": 0.8550,
+    "USDCAD": 1.3500,
+}
+
+# Relative tick rate of each UTC hour
+ACTIVITY = np.array([
+    0.45, 0.40, 0.40, 0.40, 0.35, 0.35, 0.50, 0.80,
+    1.00, 1.10, 1.10, 1.05, 1.15, 1.40, 1.60, 1.60,
+    1.50, 1.20, 0.90, 0.80, 0.70, 0.60, 0.40, 0.40,
+])
+
+
+def hour_file(download_path, symbol:str, hour:datetime) -> Path:
+    return Path(f"{download_path}{symbol}/{hour.year}/{hour.month-1:0>2}/{hour.day:0>2}/{hour.hour:0>2}h_ticks.bi5")
+
+
+def hour_records(rng:np.random.Generator, ticks:int, price_points:int) -> tuple:
+    """Return (records, last bid) of one hour of ticks starting around price_points"""
+    records = np.empty(ticks, TICK_DTYPE)
+    records["TIME"] = np.sort(rng.integers(0, 3_600_000, ticks))
+    bid = price_points + np.cumsum(rng.choice([-2, -1, 0, 0, 1, 2], ticks))
+    records["BIDP"] = bid
+    records["ASKP"] = bid + rng.integers(1, 4, ticks)
+    records["ASKV"] = np.round(rng.lognormal(0, 0.6, ticks), 2)
+    records["BIDV"] = np.round(rng.lognormal(0, 0.6, ticks), 2)
+    return records, int(bid[-1]) if ticks else price_points
+
+
+def generate(download_path:str, start:datetime, end:datetime, symbols=("EURUSD",), ticks_per_hour:int=1500,
+             gap_rate:float=0.0, weekend_files:bool=True, seed:int=0) -> dict:
+    """Write the hour files of symbols from start to end (exclusive) and return per-symbol counts.
+
+    ticks_per_hour is the average rate at an activity of 1.0, gap_rate the
+    share of trading hours left without a file, and weekend_files whether
+    closed hours get a zero-byte file.
+    """
+    calendar = TradingCalendar(holidays=[])
+    rng = np.random.default_rng(seed)
+    summary = {}
+    for symbol in symbols:
+        price_points = int(SYMBOLS.get(symbol, 1.0) * POINT)
+        counts = {"hours": 0, "ticks": 0, "empty": 0, "missing": 0}
+        hour = start
+        while hour < end:
+            path = hour_file(download_path, symbol, hour)
+            if not calendar.is_open(hour):
+                if weekend_files:
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    path.write_bytes(b"")
+                    counts["empty"] += 1
+            elif rng.random() < gap_rate:
+                counts["missing"] += 1
+            else:
+                ticks = int(rng.poisson(ticks_per_hour * ACTIVITY[hour.hour]))
+                records, price_points = hour_records(rng, ticks, price_points)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_bytes(lzma.compress(records.tobytes(), format=lzma.FORMAT_ALONE) if ticks else b"")
+                counts["hours"] += 1
+                counts["ticks"] += ticks
+            hour += HOUR
+        summary[symbol] = counts
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic Dukascopy download tree")
+    parser.add_argument("download_path", type=str, help="Download directory, eg. $DATA_DIR/dukascopy_live/download")
+    parser.add_argument("--start", type=str, default="2024-01-01", help="First hour to write (YYYY-MM-DD)")
+    parser.add_argument("--end", type=str, default="2024-02-01", help="Day after the last hour to write (YYYY-MM-DD)")
+    parser.add_argument("--symbols", type=str, nargs="+", default=["EURUSD"], help="Symbols to write")
+    parser.add_argument("--ticks-per-hour", type=int, default=1500, help="Average ticks of an hour at full activity")
+    parser.add_argument("--gap-rate", type=float, default=0.0, help="Share of trading hours left without a file")
+    parser.add_argument("--no-weekend-files", action="store_true", help="Do not write zero-byte files for weekend hours")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    download_path = args.download_path if args.download_path.endswith("/") else args.download_path + "/"
+    summary = generate(download_path, datetime.fromisoformat(args.start), datetime.fromisoformat(args.end),
+                       args.symbols, args.ticks_per_hour, args.gap_rate, not args.no_weekend_files, args.seed)
+    for symbol, counts in summary.items():
+        print(f"{symbol}: {counts['hours']} hours, {counts['ticks']} ticks, {counts['empty']} empty, {counts['missing']} missing")
@@ -0,0 +1,255 @@
+"""Bar cache shared by the research processes of one machine.
+
+A BarCacheServer (dukascopy-data-manager.py bar-cache) loads each requested
+symbol/timeframe series once and writes it as a memory-mapped file of typed
+columns: the int64 nanosecond dates, then each value column, 8 byte aligned.
+The files live in a RAM-backed directory (/dev/shm by default), so every
+client mapping one reads the same physical pages: RAM use grows with the
+number of distinct series, not with the number of processes.
+
+Clients send JSON line requests over a local TCP port and get back the file
+and its column layout; BarCacheClient maps it read-only and returns frames
+whose columns and index are views of the mapping. Before answering, the
+server compares the mtimes of the series' resampled file with the ones it
+was loaded from, and reloads it into a new file when they changed. Files
+are evicted least recently requested first once their total size exceeds
+the memory budget; processes still mapping an evicted file keep reading it
+until they drop their frames. Every answer carries the number of files the
+server has removed so far, and a client seeing it change drops its own
+mappings of the removed files.
+"""
+import json
+import os
+import socket
+import socketserver
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import modes
+
+DEFAULT_PORT = int(os.environ.get("DUKASCOPY_BAR_CACHE_PORT", "8798"))
+SUFFIX = ".bars"
+ALIGN = 8
+
+
+def default_directory() -> Path:
+    if os.environ.get("DUKASCOPY_BAR_CACHE_DIR"):
+        return Path(os.environ["DUKASCOPY_BAR_CACHE_DIR"]).expanduser()
+    shm = Path("/dev/shm")
+    return (shm if shm.is_dir() else Path(tempfile.gettempdir())) / "dukascopy_bars"
+
+
+def write_columns(path:Path, df:pd.DataFrame) -> dict:
+    """Write the dates and columns of df to path; returns the layout clients map it with"""
+    arrays = [(df.index.name or "date", df.index.to_numpy(dtype="datetime64[ns]").view(np.int64))]
+    for name in df.columns:
+        values = df[name].to_numpy()
+        if values.dtype.kind not in "iufb":
+            raise TypeError(f"column {name} of {path.stem} is not numeric")
+        arrays.append((name, values))
+
+    columns = []
+    offset = 0
+    for name, values in arrays:
+        columns.append([str(name), values.dtype.str, offset])
+        offset += -(-values.nbytes // ALIGN) * ALIGN
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        for (_, values), (_, _, start) in zip(arrays, columns):
+            f.seek(start)
+            f.write(np.ascontiguousarray(values).tobytes())
+        f.truncate(max(offset, 1))
+    os.replace(tmp_path, path)
+    return {"path": str(path), "rows": len(df), "columns": columns, "bytes": max(offset, 1)}
+
+
+def map_columns(layout:dict) -> pd.DataFrame:
+    """A read-only frame over the file described by layout, sharing its pages"""
+    buffer = np.memmap(layout["path"], dtype=np.uint8, mode="r")
+    rows = layout["rows"]
+    arrays = [np.ndarray((rows,), dtype=np.dtype(dtype), buffer=buffer, offset=offset) for _, dtype, offset in layout["columns"]]
+    names = [name for name, _, _ in layout["columns"]]
+    index = pd.DatetimeIndex(arrays[0].view("datetime64[ns]"), name=names[0], copy=False)
+    return pd.DataFrame(dict(zip(names[1:], arrays[1:])), index=index, copy=False)
+
+
+class BarCacheServer:
+    """Loads series with loader(symbol, timeframe, fmt, nocache) and serves them from memory-mapped files.
+
+    signature(symbol, timeframe, fmt) identifies the version of a series'
+    source (None when it does not exist yet). Use serve_forever(), and
+    close() to stop and remove the files.
+    """
+
+    def __init__(self, loader, signature, budget_bytes:int, port:int=DEFAULT_PORT, host:str="127.0.0.1", directory=None):
+        self.loader = loader
+        self.signature = signature
+        self.budget_bytes = budget_bytes
+        self.directory = Path(directory) if directory else default_directory()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for stale in self.directory.glob(f"*{SUFFIX}"):
+            stale.unlink()
+        # (symbol, timeframe, fmt): (signature, layout), least recently requested first
+        self.entries = OrderedDict()
+        self.cached_bytes = 0
+        self.loads = {}
+        self.version = 0
+        # Files removed so far (evicted or replaced by a reload), for clients to drop their mappings
+        self.generation = 0
+        self.stats = {"hits": 0, "loads": 0, "evictions": 0}
+        self.lock = threading.Lock()
+
+        cache = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    self.wfile.write((json.dumps(cache.handle(json.loads(line))) + "\n").encode())
+                    self.wfile.flush()
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self.server = socketserver.ThreadingTCPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.address = self.server.server_address
+
+    def serve_forever(self) -> None:
+        self.server.serve_forever()
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        with self.lock:
+            for key in list(self.entries):
+                self._evict(key)
+
+    def handle(self, request:dict) -> dict:
+        try:
+            if request.get("op") == "stats":
+                with self.lock:
+                    return {**self.stats, "entries": len(self.entries), "bytes": self.cached_bytes, "budget": self.budget_bytes}
+            layout = self.layout(request["symbol"], request["timeframe"], request.get("fmt", "csv"), request.get("nocache", False))
+            with self.lock:
+                return {**layout, "generation": self.generation}
+        except Exception as e:
+            return {"error": str(e), "type": type(e).__name__}
+
+    def layout(self, symbol:str, timeframe:str, fmt:str="csv", nocache:bool=False) -> dict:
+        """Layout of the file holding the current version of a series, loading it if needed"""
+        key = (symbol, timeframe, fmt)
+        with self.lock:
+            load_lock = self.loads.setdefault(key, threading.Lock())
+        # Requests for the same series wait for one load; other series load in parallel
+        with load_lock:
+            signature = self.signature(symbol, timeframe, fmt)
+            with self.lock:
+                entry = self.entries.get(key)
+                if entry is not None and entry[0] == signature and not nocache:
+                    self.entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return entry[1]
+
+            df = self.loader(symbol, timeframe, fmt, nocache)
+            signature = self.signature(symbol, timeframe, fmt)
+            with self.lock:
+                self.version += 1
+                name = f"{symbol}_{timeframe}_{fmt}_{self.version}{SUFFIX}"
+            layout = write_columns(self.directory / name, df)
+
+            with self.lock:
+                if key in self.entries:
+                    self._evict(key, count=False)
+                self.entries[key] = (signature, layout)
+                self.cached_bytes += layout["bytes"]
+                self.stats["loads"] += 1
+                while self.cached_bytes > self.budget_bytes and len(self.entries) > 1:
+                    self._evict(next(iter(self.entries)))
+            return layout
+
+    def _evict(self, key, count:bool=True) -> None:
+        _, layout = self.entries.pop(key)
+        self.cached_bytes -= layout["bytes"]
+        self.generation += 1
+        if count:
+            self.stats["evictions"] += 1
+        # Processes mapping the file keep its pages until they unmap it
+        try:
+            os.unlink(layout["path"])
+        except OSError:
+            pass
+
+
+class BarCacheClient:
+    """Connection to a BarCacheServer. Frames it returns are read-only views and must not be modified in place"""
+
+    def __init__(self, port:int=DEFAULT_PORT, host:str="127.0.0.1", timeout:float=None):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.file = self.sock.makefile("rwb")
+        self.lock = threading.Lock()
+        # (symbol, timeframe, fmt): (path, frame) of the version last mapped
+        self.frames = {}
+        self.generation = 0
+
+    def close(self) -> None:
+        self.file.close()
+        self.sock.close()
+        self.frames.clear()
+
+    def request(self, **message) -> dict:
+        with self.lock:
+            self.file.write((json.dumps(message) + "\n").encode())
+            self.file.flush()
+            line = self.file.readline()
+        if not line:
+            raise ConnectionError("the bar cache closed the connection")
+        response = json.loads(line)
+        if "error" in response:
+            if response["type"] == "FileNotFoundError":
+                raise FileNotFoundError(response["error"])
+            raise Exception(response["error"])
+        return response
+
+    def stats(self) -> dict:
+        return self.request(op="stats")
+
+    def bars(self, symbol:str, timeframe:str, fmt:str="csv", nocache:bool=False) -> pd.DataFrame:
+        """The whole series, mapped from the server's file"""
+        key = (symbol, timeframe, fmt)
+        for attempt in range(2):
+            layout = self.request(symbol=symbol, timeframe=timeframe, fmt=fmt, nocache=nocache)
+            if layout["generation"] != self.generation:
+                self._drop_removed()
+                self.generation = layout["generation"]
+            cached = self.frames.get(key)
+            if cached is not None and cached[0] == layout["path"]:
+                return cached[1]
+            try:
+                df = map_columns(layout)
+            except FileNotFoundError:
+                # Evicted between the answer and the mapping, ask again once
+                if attempt:
+                    raise
+                continue
+            self.frames[key] = (layout["path"], df)
+            return df
+
+    def _drop_removed(self) -> None:
+        """Forget the frames of files the server removed, so their memory is freed once callers drop them too"""
+        for key, (path, _) in list(self.frames.items()):
+            if not os.path.exists(path):
+                del self.frames[key]
+
+    def get_price_df_resampled(self, timeframe, symbol=None, verbose=True, nocache=False, mode:str="full",
+                               fmt:str="csv", start=None, end=None) -> pd.DataFrame:
+        """main.get_price_df_resampled served from the cache: [start, end) of the series, without copying"""
+        if symbol is None:
+            raise ValueError("symbol is required")
+        df = self.bars(symbol, timeframe, fmt, nocache)
+        start = modes.view_start(mode, start)
+        begin = 0 if start is None else df.index.searchsorted(pd.Timestamp(start))
+        stop = len(df) if end is None else df.index.searchsorted(pd.Timestamp(end))
+        return df.iloc[begin:stop]
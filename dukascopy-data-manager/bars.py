@@ -0,0 +1,163 @@
+"""Single-pass OHLC aggregation of decoded ticks.
+
+Bars are given like the export timeframe: a number followed by a unit.
+    t: ticks (eg. 100t)
+    v: volume, ask + bid (eg. 500v)
+    q: quote notional, mid price * volume (eg. 1000q)
+    r: range in points, high - low of the bid (eg. 50r)
+Anything else is a time offset understood by pandas (eg. 15m, 4h, 1D).
+
+Bar boundaries are found once and every bid/ask/volume column is then
+reduced over the same boundaries with np.*.reduceat, instead of one
+groupby/resample pass per column. Volume, notional and range bars start a
+fresh bar after each one closes, so recomputing from the start of any bar
+gives the same bars.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+POINT = 100_000
+EVENT_UNITS = {"t", "v", "q", "r"}
+TIME = "time"
+COLUMNS = ["date", "open", "high", "low", "close", "vol", "ao", "ah", "al", "ac", "av", "tv"]
+_EVENT_SPEC = re.compile(r"^(\d+(?:\.\d+)?)([tvqr])$")
+_RANGE_WINDOW = 256
+
+
+def parse(spec:str):
+    """Return (unit, size): an event unit and its threshold, or TIME and a Timedelta"""
+    match = _EVENT_SPEC.match(spec)
+    if match is None:
+        return TIME, pd.Timedelta(spec)
+    size = float(match.group(1))
+    if match.group(2) in ("t", "r"):
+        size = int(size)
+    return match.group(2), size
+
+
+def tick_arrays(df:pd.DataFrame) -> dict:
+    """NumPy views of an export tick frame (TIME, ASKP, BIDP, ASKV, BIDV)"""
+    return {
+        "time": df["TIME"].to_numpy(dtype="datetime64[ns]").view(np.int64),
+        "bid": df["BIDP"].to_numpy(),
+        "ask": df["ASKP"].to_numpy(),
+        "bidv": df["BIDV"].to_numpy(),
+        "askv": df["ASKV"].to_numpy(),
+    }
+
+
+def _threshold_starts(values:np.ndarray, size:float):
+    """Starts of bars that close on the tick where their summed values reach size"""
+    cumulative = np.cumsum(values, dtype=np.float64)
+    starts = []
+    start, base = 0, 0.0
+    while start < len(values):
+        starts.append(start)
+        last = int(np.searchsorted(cumulative, base + size))
+        if last >= len(values):
+            return starts, False
+        start, base = last + 1, cumulative[last]
+    return starts, True
+
+
+def _range_starts(bid:np.ndarray, size:int):
+    """Starts of bars whose bid high - low stays within size points"""
+    points = np.rint(bid * POINT).astype(np.int64)
+    starts = []
+    start = 0
+    while start < len(points):
+        starts.append(start)
+        window = _RANGE_WINDOW
+        while True:
+            segment = points[start:start + window]
+            spread = np.maximum.accumulate(segment) - np.minimum.accumulate(segment)
+            over = np.flatnonzero(spread > size)
+            if len(over):
+                start += int(over[0])
+                break
+            if start + window >= len(points):
+                start = len(points)
+                break
+            window *= 4
+    return starts, False
+
+
+def bar_starts(ticks:dict, unit:str, size, origin=None):
+    """Return (starts, labels, closed) for the bars over ticks.
+
+    starts are the positions of each bar's first tick and labels its date
+    (epoch ns): the bin start for time bars (aligned on origin), the first
+    tick otherwise. closed tells whether the last bar is known to be complete.
+    """
+    times = ticks["time"]
+    count = len(times)
+    if count == 0:
+        return np.empty(0, np.int64), np.empty(0, np.int64), True
+    if unit == TIME:
+        step = size.value
+        bins = (times - pd.Timestamp(origin).value) // step
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(bins)) + 1))
+        return starts, pd.Timestamp(origin).value + bins[starts] * step, False
+
+    if unit == "t":
+        starts, closed = np.arange(0, count, size), count % size == 0
+    elif unit == "r":
+        starts, closed = _range_starts(ticks["bid"], size)
+    else:
+        values = ticks["askv"].astype(np.float64) + ticks["bidv"]
+        if unit == "q":
+            values *= (ticks["ask"] + ticks["bid"]) / 2
+        starts, closed = _threshold_starts(values, size)
+    starts = np.asarray(starts, dtype=np.int64)
+    return starts, times[starts], closed
+
+
+def reduce(ticks:dict, starts:np.ndarray, labels:np.ndarray, stop:int) -> pd.DataFrame:
+    """OHLC, volume and tick count of the bars starting at starts, the last one ending before stop"""
+    if len(starts) == 0:
+        return pd.DataFrame({name: [] for name in COLUMNS})
+    lasts = np.append(starts[1:], stop) - 1
+    columns = {"date": pd.DatetimeIndex(labels.astype("datetime64[ns]"))}
+    for prefix, price, volume in (("", "bid", "bidv"), ("a", "ask", "askv")):
+        prices = ticks[price][:stop]
+        ohlc = {
+            "open": prices[starts],
+            "high": np.maximum.reduceat(prices, starts),
+            "low": np.minimum.reduceat(prices, starts),
+            "close": prices[lasts],
+        }
+        if prefix:
+            ohlc = {prefix + name[0]: values for name, values in ohlc.items()}
+        columns.update(ohlc)
+        # Volumes are summed in float64 and rounded back like pandas' float32 sums
+        volumes = ticks[volume][:stop]
+        columns["av" if prefix else "vol"] = np.add.reduceat(volumes.astype(np.float64), starts).astype(volumes.dtype)
+    columns["tv"] = lasts + 1 - starts
+    return pd.DataFrame(columns)
+
+
+def aggregate(df:pd.DataFrame, spec:str, origin="start_day") -> pd.DataFrame:
+    """Aggregate an export tick frame into bars (empty time bins are left out)"""
+    unit, size = parse(spec)
+    if unit == TIME and isinstance(origin, str):
+        origin = df["TIME"].iloc[0].floor("D") if len(df) else pd.Timestamp(0)
+    ticks = tick_arrays(df)
+    starts, labels, _ = bar_starts(ticks, unit, size, origin)
+    return reduce(ticks, starts, labels, len(df))
+
+
+def ohlc(times:np.ndarray, prices:np.ndarray, step:pd.Timedelta):
+    """Return (labels, open, high, low, close) of the non-empty time bars of one sorted price series.
+
+    times are epoch ns and bins are aligned on the epoch, which for steps
+    dividing a day is the same as pandas' default start_day origin.
+    """
+    if not len(times):
+        return times, prices, prices, prices, prices
+    bins = times // step.value
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(bins)) + 1))
+    lasts = np.append(starts[1:], len(times)) - 1
+    return (bins[starts] * step.value, prices[starts], np.maximum.reduceat(prices, starts),
+            np.minimum.reduceat(prices, starts), prices[lasts])
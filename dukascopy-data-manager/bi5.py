@@ -0,0 +1,116 @@
+"""Decoding of Dukascopy .bi5 hourly tick files.
+
+Each file is an LZMA stream of big-endian 20 byte records. TIME is the
+millisecond offset from the start of the hour and prices are integer points.
+"""
+import concurrent.futures
+import lzma
+from pathlib import Path
+
+import numpy as np
+from rich.progress import track
+
+TICK_DTYPE = np.dtype([('TIME', '>i4'), ('ASKP', '>i4'), ('BIDP', '>i4'), ('ASKV', '>f4'), ('BIDV', '>f4')])
+
+EMPTY_RECORDS = np.empty(0, TICK_DTYPE)
+
+HOUR_MS = 3_600_000
+# Largest plausible ask - bid, and move between two ticks, relative to the bid
+MAX_SPREAD = 0.05
+MAX_JUMP = 0.10
+
+
+def read_payload(path) -> bytes:
+    """Return the decompressed payload of one hour file, or of a packed hour (anything with a payload() method)"""
+    if hasattr(path, "payload"):
+        return path.payload()
+    raw = Path(path).read_bytes()
+    # lzma.decompress releases the GIL, so this scales across threads
+    return lzma.decompress(raw) if raw else b""
+
+
+def read_records(path) -> np.ndarray:
+    """Return the raw records of one hour file or packed hour (empty for an empty hour)"""
+    payload = read_payload(path)
+    if not payload:
+        return EMPTY_RECORDS
+    return np.frombuffer(payload, TICK_DTYPE)
+
+
+def hour_ms(times) -> np.ndarray:
+    """Convert hour start datetimes to int64 epoch milliseconds"""
+    return np.array(times, dtype="datetime64[ms]").astype(np.int64)
+
+
+def decode_files(filenames, hour_starts_ms, workers=None, description="Decoding tick files...", show_progress=True):
+    """Decode hour files in parallel into one set of column arrays.
+
+    hour_starts_ms holds the epoch millisecond start of each file's hour.
+    Returns a dict of TIME (int64 epoch ms), ASKP/BIDP (int32 points) and
+    ASKV/BIDV (float32) arrays, ordered like filenames, and COUNT, the number
+    of ticks of each file.
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(read_records, filenames)
+        if show_progress:
+            results = track(results, total=len(filenames), description=description)
+        records = list(results)
+    return concat_records(records, hour_starts_ms)
+
+
+def concat_records(records, hour_starts_ms) -> dict:
+    """Copy per-hour record arrays into one buffer and convert it to columns"""
+    counts = np.fromiter((len(r) for r in records), dtype=np.int64, count=len(records))
+    buffer = np.empty(int(counts.sum()), TICK_DTYPE)
+    offset = 0
+    for rec in records:
+        buffer[offset:offset + len(rec)] = rec
+        offset += len(rec)
+
+    time = buffer["TIME"].astype(np.int64)
+    time += np.repeat(np.asarray(hour_starts_ms, dtype=np.int64), counts)
+    return {
+        "TIME": time,
+        "ASKP": buffer["ASKP"].astype(np.int32),
+        "BIDP": buffer["BIDP"].astype(np.int32),
+        "ASKV": buffer["ASKV"].astype(np.float32),
+        "BIDV": buffer["BIDV"].astype(np.float32),
+        "COUNT": counts,
+    }
+
+
+def check_file(path):
+    """Return what is wrong with an hour file or packed hour, or None if it decodes to plausible ticks"""
+    try:
+        payload = read_payload(path)
+    except OSError as e:
+        return f"unreadable: {e}"
+    except (lzma.LZMAError, EOFError) as e:
+        return f"LZMA stream does not decode: {e}"
+    if len(payload) % TICK_DTYPE.itemsize:
+        return f"payload of {len(payload)} bytes is not a multiple of the {TICK_DTYPE.itemsize} byte record"
+    return check_records(np.frombuffer(payload, TICK_DTYPE))
+
+
+def check_records(records:np.ndarray):
+    """Return what is implausible about the records of one hour, or None"""
+    times = records["TIME"]
+    if len(times) and (times.min() < 0 or times.max() >= HOUR_MS):
+        return f"tick time offsets outside the hour ({times.min()} to {times.max()} ms)"
+    if np.any(np.diff(times) < 0):
+        return "tick times are not in order"
+    bid = records["BIDP"].astype(np.float64)
+    ask = records["ASKP"].astype(np.float64)
+    if np.any(bid <= 0):
+        return "non-positive bid price"
+    if np.any(ask < bid):
+        return "ask below bid"
+    if np.any(ask - bid > bid * MAX_SPREAD):
+        return f"spread above {MAX_SPREAD:.0%} of the bid"
+    if len(bid) > 1 and np.any(np.abs(np.diff(bid)) > bid[:-1] * MAX_JUMP):
+        return f"bid moves more than {MAX_JUMP:.0%} between two ticks"
+    for column in ("ASKV", "BIDV"):
+        volumes = records[column]
+        if not np.all(np.isfinite(volumes)) or np.any(volumes < 0):
+            return f"invalid {column} volume"
+    return None
@@ -0,0 +1,161 @@
+"""Pooled HTTP downloader for Dukascopy hour files.
+
+All downloads of a run share one thread pool, one requests.Session per worker
+thread (so connections are kept alive) and one global rate limit. Transient
+failures (5xx, 429, timeouts, dropped connections) are retried with
+exponential backoff, and files are written to a temporary name and renamed
+into place so an interrupted run never leaves a truncated file behind.
+"""
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+# Override with a local stand-in server for testing
+BASE_URL = os.environ.get("DUKASCOPY_BASE_URL", "https://datafeed.dukascopy.com/datafeed/")
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """Token bucket shared by all download threads"""
+
+    def __init__(self, rate:float, burst:int=None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class Downloader:
+    """Pool of download threads. Use as a context manager, or call close() when done"""
+
+    def __init__(self, concurrent:int=3, rate:float=0, retries:int=5, backoff:float=0.5, timeout=(10, 30)):
+        self.concurrent = concurrent
+        self.limiter = RateLimiter(rate) if rate > 0 else None
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.local = threading.local()
+        self.retry_count = 0
+        self.lock = threading.Lock()
+        # Threads (and their sessions) live as long as the downloader, so
+        # connections stay open across successive batches of files
+        self.executor = ThreadPoolExecutor(max_workers=concurrent)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        self.executor.shutdown()
+
+    def submit(self, filename:Path, url:str, is_force:bool=False, on_empty=None, symbol:str="") -> Future:
+        return self.executor.submit(self.download_file, filename, url, is_force, on_empty, symbol)
+
+    def session(self) -> requests.Session:
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self.local.session = session
+        return session
+
+    def fetch(self, url:str, symbol:str=""):
+        """Return the response body, or None for a non-retryable error status"""
+        for attempt in range(self.retries + 1):
+            if self.limiter is not None:
+                self.limiter.acquire()
+            started = time.perf_counter()
+            try:
+                r = self.session().get(url, timeout=self.timeout)
+            # ChunkedEncodingError is a connection dropped in the middle of the body
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError):
+                metrics.observe("request_seconds", time.perf_counter() - started, symbol)
+                if attempt == self.retries:
+                    raise
+            else:
+                metrics.observe("request_seconds", time.perf_counter() - started, symbol)
+                if r.status_code not in RETRY_STATUS:
+                    if not r:
+                        print(f"Error: {r} for {url}")
+                        return None
+                    return r.content
+                if attempt == self.retries:
+                    r.raise_for_status()
+            with self.lock:
+                self.retry_count += 1
+            metrics.count("retries", 1, symbol)
+            time.sleep(self.backoff * 2 ** attempt * (1 + random.random()))
+
+    def poll(self, url:str, etag:str=None, symbol:str=""):
+        """Conditional GET of a file that may still be growing, without retries.
+
+        Returns (status, content, etag): status is None when the request
+        failed, and content is None unless the file was served (200), eg. it
+        is unchanged since etag (304) or not published yet (404).
+        """
+        if self.limiter is not None:
+            self.limiter.acquire()
+        headers = {"If-None-Match": etag} if etag else {}
+        started = time.perf_counter()
+        try:
+            r = self.session().get(url, headers=headers, timeout=self.timeout)
+        except (requests.ConnectionError, requests.Timeout):
+            return None, None, etag
+        finally:
+            metrics.observe("request_seconds", time.perf_counter() - started, symbol)
+        if r.status_code != 200:
+            return r.status_code, None, etag
+        return r.status_code, r.content, r.headers.get("ETag")
+
+    def download_file(self, filename:Path, url:str, is_force:bool=False, on_empty=None, symbol:str=""):
+        """Download url to filename. on_empty, if given, is called instead of writing an empty file.
+
+        Returns the size of the file (0 for an empty hour), or None if the request failed.
+        """
+        if not is_force and filename.exists():
+            size = filename.stat().st_size
+            if not size and on_empty is not None:
+                on_empty()
+            return size
+
+        content = self.fetch(url, symbol)
+        if content is None:
+            return None
+        if not content and on_empty is not None:
+            on_empty()
+            return 0
+
+        filename.parent.mkdir(exist_ok=True, parents=True)
+        tmp_file = filename.with_name(f"{filename.name}.{os.getpid()}.{threading.get_ident()}.part")
+        with open(tmp_file, "wb") as f:
+            f.write(content)
+        os.replace(tmp_file, filename)
+        metrics.count("files_downloaded", 1, symbol)
+        metrics.count("bytes_downloaded", len(content), symbol)
+        return len(content)
@@ -3,17 +3,56 @@ from typing_extensions import Annotated
 from rich.progress import track
 from rich.console import Console
 from rich.table import Table
-import requests
 import concurrent.futures
+import itertools
+import multiprocessing
+import queue
+import sys
+import threading
+from functools import partial
 from pathlib import Path
 from datetime import datetime, timedelta, timezone
-import lzma
-import numpy as np
 import pandas as pd
 import os
+import json
+import shutil
+
+import bar_cache
+import bars
+import bi5
+import downloader
+from downloader import Downloader
+import incremental
+import metrics
+import modes
+import parquet_store
+import tick_cache
+import inventory
+import live
+import month_pack
+from trading_calendar import TradingCalendar
 
 app = typer.Typer()
 
+@app.callback()
+def run(ctx:typer.Context):
+    """
+    Download, export and inspect Dukascopy tick data.\n
+    Set DUKASCOPY_METRICS_DIR to write a JSON report and a Prometheus textfile of each run's metrics there.
+    """
+    ctx.call_on_close(lambda: metrics.write_run_report(ctx.invoked_subcommand))
+
+# Downloads submitted to the pool ahead of the ones completed, per download thread
+DOWNLOAD_WINDOW_PER_THREAD = 4
+
+# Live progress displays can't overlap, so the pipeline command turns them off
+SHOW_PROGRESS = True
+
+def progress_track(sequence, total=None, description="Working..."):
+    if SHOW_PROGRESS:
+        return track(sequence, total=total, description=description)
+    return sequence
+
 # Load environment variables from .env file
 def load_env():
     """Load environment variables from .env file in parent directory"""
@@ -28,27 +67,26 @@ def load_env():
 
 load_env()
 
-def get_paths(mode: str = "full"):
-    """Get download and export paths based on mode (recent or full)"""
+def get_base_path():
     data_dir = os.environ.get('DATA_DIR')
     if not data_dir:
         raise ValueError("DATA_DIR not found in environment. Please set it in .env file")
-    base_path = f"{os.path.expanduser(data_dir)}/dukascopy_live/"
-    if mode == "recent":
-        download_path = f"{base_path}recent/download/"
-        export_path = f"{base_path}recent/resampled/"
-    else:
-        download_path = f"{base_path}full/download/"
-        export_path = f"{base_path}full/resampled/"
-    return download_path, export_path
+    return f"{os.path.expanduser(data_dir)}/dukascopy_live/"
+
+def get_paths(mode: str = "full"):
+    """Get download and export paths. Both modes share one store (see modes.py)"""
+    base_path = get_base_path()
+    return f"{base_path}download/", f"{base_path}resampled/"
 
 @app.command()
 def download(assets:Annotated[list[str], typer.Argument(help="Give a list of assets to download. Eg. EURUSD AUDUSD")],
              start:Annotated[str, typer.Argument(help="Start date to download in YYYY-MM-DD format. Eg. 2024-01-08")],
              end:Annotated[str, typer.Option(help="End date to download in YYYY-MM-DD format. If not provided, will download until current date Eg. 2024-01-08")]="",
-             concurrent:Annotated[int, typer.Option(help="Max number of concurrent downloads (defaults to 3)")]=3,
+             concurrent:Annotated[int, typer.Option(help="Max number of concurrent downloads across all assets (defaults to 3)")]=3,
              force:Annotated[bool, typer.Option(help="Redownload files. By default, without this flag, files that already exist will be skipped")]=False,
-             mode:Annotated[str, typer.Option(help="Mode: 'recent' or 'full' - determines which directories to use")]="full"):
+             mode:Annotated[str, typer.Option(help="Mode: 'recent' or 'full' - both use the same store")]="full",
+             rate:Annotated[float, typer.Option(help="Max requests per second across all assets (0 for no limit)")]=0,
+             retries:Annotated[int, typer.Option(help="Retries with exponential backoff on 5xx responses and timeouts")]=5):
     """
     Download assets
     """
@@ -56,64 +94,95 @@ def download(assets:Annotated[list[str], typer.Argument(help="Give a list of ass
     
     start_date_str = start.split("-")
     end_date = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(hours=1)
-    base_url = "https://datafeed.dukascopy.com/datafeed/"
 
     if end != "":
         end_date = end.split("-")
         end_date = datetime(int(end_date[0]), int(end_date[1]), int(end_date[2]))
 
-    processes = concurrent
-
-    delta = timedelta(hours=1)
-    for asset in assets:
-        filenames = []
-        urls = []
-        forces = []
-
-        start_date = datetime(int(start_date_str[0]), int(start_date_str[1]), int(start_date_str[2]))
-        while start_date <= end_date:
-            year = start_date.year
-            month = start_date.month-1
-            day = start_date.day
-            hour = start_date.hour
-
-            filenames.append(Path(f"{download_path}{asset}/{year}/{month:0>2}/{day:0>2}/{hour:0>2}h_ticks.bi5"))
-            urls.append(f"{base_url}{asset}/{year}/{month:0>2}/{day:0>2}/{hour:0>2}h_ticks.bi5")
-            forces.append(force)
-
-            start_date += delta
-        inputs = zip(filenames, urls, forces)
-        download_file_parallel(inputs, asset, len(filenames), processes)
+    start_date = datetime(int(start_date_str[0]), int(start_date_str[1]), int(start_date_str[2]))
+    with Downloader(concurrent, rate, retries) as downloader_pool:
+        download_assets([(asset, start_date) for asset in assets], end_date, download_path, downloader_pool, force)
     print("Download completed")
 
-def download_file_parallel(file_url_zip, asset:str, length:int, processes_num=None):
-    with concurrent.futures.ThreadPoolExecutor(max_workers=processes_num) as executor:
-        args_list = tuple(file_url_zip)
-        results = [executor.submit(download_file, args) for args in args_list]
-        for future in track(concurrent.futures.as_completed(results), total=length, description=f"Downloading {asset}..."):
-            try:
-                future.result()  # This will raise any exception that occurred
-            except Exception as e:
-                print(f"Warning: Download failed for one file: {e}")
-                # Continue with other downloads
+def download_assets(asset_starts, end_date:datetime, download_path:str, downloader_pool:Downloader, force:bool=False):
+    """Download each (asset, start_date) up to end_date through one shared downloader"""
+    calendar = TradingCalendar()
+    with inventory.for_download_path(download_path) as inv:
+        jobs = []
+        for asset, start_date in asset_starts:
+            jobs.extend(download_jobs(download_path, asset, start_date, end_date, calendar, inv, force))
 
-def download_file(args):
-    filename, url, is_force = args[0], args[1], args[2]
+        description = asset_starts[0][0] if len(asset_starts) == 1 else f"{len(asset_starts)} assets"
+        download_file_parallel(jobs, description, downloader_pool, inv, download_path, force)
 
-    if filename.exists() and not is_force:
-        return
+def download_jobs(download_path:str, asset:str, start_date:datetime, end_date:datetime,
+                  calendar:TradingCalendar, inv:inventory.Inventory, force:bool=False):
+    """Return (asset, hour) for every trading hour of asset from start_date to end_date.
 
-    r = requests.get(url, timeout=(10, 30))  # 10s connect timeout, 30s read timeout
-    if not r:
-        print(f"Error: {r} for {url}")
-        return
-    # else:
-    #     print(f"Succes: {r} for {url}")
+    Hours the inventory knows are present or empty are skipped unless force is set,
+    and so are packed hours, which are recorded in the inventory if it lacks them.
+    """
+    known = {} if force else inv.hours(asset, start_date, end_date)
+    packs = month_pack.PackedAsset(f"{download_path}{asset}")
+    jobs = []
+    for date in calendar.hours(start_date, end_date):
+        status = known.get(inventory.hour_key(date), (None,))[0]
+        if status == inventory.PRESENT or status == inventory.EMPTY:
+            continue
+        packed = None if force else packs.lookup(date)
+        if packed is not None:
+            _record_packed(inv, asset, date, packed)
+            continue
+        jobs.append((asset, date))
+    return jobs
+
+def _record_packed(inv:inventory.Inventory, asset:str, date:datetime, packed:month_pack.PackedHour) -> None:
+    if packed.size:
+        inv.record(asset, date, inventory.PRESENT, packed.size)
+    else:
+        inv.mark_empty(asset, date)
+
+def hour_file(download_path:str, asset:str, date:datetime):
+    """Return the (filename, url) of an hour of asset"""
+    path = f"{asset}/{date.year}/{date.month-1:0>2}/{date.day:0>2}/{date.hour:0>2}h_ticks.bi5"
+    return Path(f"{download_path}{path}"), f"{downloader.BASE_URL}{path}"
 
-    filename.parent.mkdir(exist_ok=True, parents=True)
+def download_file_parallel(jobs, asset:str, downloader_pool:Downloader, inv:inventory.Inventory, download_path:str, force:bool=False):
+    """Download (asset, hour) jobs, recording each outcome in the inventory"""
+    # A batch of several assets is timed as a whole
+    stage_symbol = asset if len({job[0] for job in jobs}) == 1 else ""
+    # Only a few jobs per thread are in flight, so a full history doesn't hold millions of futures at once
+    window = DOWNLOAD_WINDOW_PER_THREAD * downloader_pool.concurrent
+    remaining = iter(jobs)
+    pending = {}
 
-    with open(filename, 'wb') as f:
-        f.write(r.content)
+    def completed():
+        while True:
+            for job_asset, date in itertools.islice(remaining, window - len(pending)):
+                filename, url = hour_file(download_path, job_asset, date)
+                # Empty hours are recorded by on_empty, on the download thread
+                future = downloader_pool.submit(filename, url, force, partial(inv.mark_empty, job_asset, date), job_asset)
+                pending[future] = (job_asset, date)
+            if not pending:
+                return
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                yield future, pending.pop(future)
+
+    with metrics.stage("download", stage_symbol):
+        for future, (job_asset, date) in progress_track(completed(), total=len(jobs), description=f"Downloading {asset}..."):
+            try:
+                size = future.result()  # This will raise any exception that occurred
+            except Exception as e:
+                print(f"Warning: Download failed for one file: {e}")
+                # Continue with other downloads
+                size = None
+            if size is None:
+                inv.record(job_asset, date, inventory.FAILED)
+            elif size:
+                inv.record(job_asset, date, inventory.PRESENT, size)
+    if downloader_pool.retry_count:
+        print(f"{downloader_pool.retry_count} requests were retried")
 
 @app.command()
 def export(assets:Annotated[list[str], typer.Argument(help="Give a list of assets to export. Use 'all' for all downloaded assets. Eg. EURUSD AUDUSD. Check export --help for more info")],
@@ -121,7 +190,12 @@ def export(assets:Annotated[list[str], typer.Argument(help="Give a list of asset
            start:Annotated[str, typer.Argument(help="Start date to export in YYYY-MM-DD format. Eg. 2024-01-08")],
            end:Annotated[str, typer.Option(help="End date to export in YYYY-MM-DD format. If not provided, will export until current date Eg. 2024-01-08")]="",
            only_absent:Annotated[bool, typer.Option(help="Only export if the file does not already exist")]=False,
-           mode:Annotated[str, typer.Option(help="Mode: 'recent' or 'full' - determines which directories to use")]="full"):
+           mode:Annotated[str, typer.Option(help="Mode: 'recent' or 'full' - both use the same store")]="full",
+           output_format:Annotated[str, typer.Option("--format", help="Output format: 'csv' or 'parquet' (date-partitioned dataset directory)")]="csv",
+           workers:Annotated[int, typer.Option(help="Number of threads decompressing tick files (defaults to the number of CPUs)")]=os.cpu_count(),
+           incremental_export:Annotated[bool, typer.Option("--incremental", help="Only decode hours after the last export (and days changed since) and rewrite the trailing bar")]=False,
+           chunk:Annotated[str, typer.Option(help="Decode and aggregate 'day' or 'month' of ticks at a time, bounding memory use")]="month",
+           write_tick_cache:Annotated[bool, typer.Option("--tick-cache", help="Also write the decoded ticks to a memory-mapped cache ({asset}/{asset}_ticks)")]=False):
     """
     Export downloaded data into different timeframes/units.\n
     assets can be selected by listing multiple with a space dividing them or a single asset.\n
@@ -129,200 +203,746 @@ def export(assets:Annotated[list[str], typer.Argument(help="Give a list of asset
     Can also use all to select all downloaded assets.\n
     Available units:\n
         t: ticks (eg. 1t)\n
+        v: volume bars, ask + bid volume per bar (eg. 500v)\n
+        q: notional bars, mid price * volume per bar (eg. 1000q)\n
+        r: range bars, max bid high - low in points (eg. 50r)\n
         s: seconds (eg. 10s)\n
         m: minutes (eg. 15m)\n
         h: hours (eg. 4h)\n
         D: days (eg. 2D)\n
         W: weeks (eg. 2W)\n
     """
+    if chunk not in ("day", "month"):
+        raise typer.BadParameter(f"Unknown chunk size {chunk}, use 'day' or 'month'")
     console = Console()
     download_path, export_path = get_paths(mode)
     
-    asset_list = []
-    if assets[0] == "all":
-        dirs = Path(download_path).glob("*")
-        for dir in dirs:
-            parts = dir.parts
-            asset_list.append(parts[1])
-    else:
-        asset_list = assets
-
-    start_date_str = start.split("-")
     end_date = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(hours=1)
 
     if end != "":
         end_date = end.split("-")
         end_date = datetime(int(end_date[0]), int(end_date[1]), int(end_date[2]))
 
-    delta = timedelta(hours=1)
-    for asset in asset_list:
-        # Determine export filename first
-        if timeframe == "1t":
-            export_file = Path(f"{export_path}/{asset}/{asset}_{timeframe}.csv")
-        else:
-            export_file = Path(f"{export_path}/{asset}/{asset}_resampled_{timeframe}.csv")
+    calendar = TradingCalendar()
+    with inventory.for_download_path(download_path) as inv:
+        if assets[0] == "all":
+            assets = inv.symbols()
+        for asset in assets:
+            # Determine export filename first
+            if timeframe == "1t":
+                export_file = Path(f"{export_path}/{asset}/{asset}_{timeframe}.csv")
+            else:
+                export_file = Path(f"{export_path}/{asset}/{asset}_resampled_{timeframe}.csv")
+            if output_format == "parquet":
+                export_file = parquet_store.dataset_path(export_file)
 
-        if only_absent and export_file.exists():
-            console.print(f"Skipping {asset} - file already exists at {export_file}")
-            continue
+            if only_absent and export_file.exists():
+                console.print(f"Skipping {asset} - file already exists at {export_file}")
+                continue
 
-        filenames = []
-        file_times = []
+            filenames = []
+            file_times = []
 
-        start_date = datetime(int(start_date_str[0]), int(start_date_str[1]), int(start_date_str[2]))
-        while start_date <= end_date:
-            year = start_date.year
-            month = start_date.month-1
-            day = start_date.day
-            hour = start_date.hour
+            asset_start = start
+            existing = incremental.load_manifest(export_file) if export_file.exists() else None
+            if existing is not None and existing["start"] < start:
+                # Recent and full runs share one export, which keeps the earliest start it was built from
+                asset_start = existing["start"]
+            start_date_str = asset_start.split("-")
+            start_date = datetime(int(start_date_str[0]), int(start_date_str[1]), int(start_date_str[2]))
+            manifest = existing if incremental_export else None
+            resume = None
+            if manifest is not None and manifest["start"] == asset_start:
+                resume = _resume_point(manifest, download_path, asset, timeframe, start_date)
+            if resume is not None and write_tick_cache and not tick_cache.can_resume(tick_cache.cache_path(export_path, asset), asset_start, resume[0]):
+                console.print(f"The tick cache of {asset} does not reach {resume[0]}, exporting it in full")
+                resume = None
+            if resume is not None:
+                resume_hour, resume_skip, cut = resume
+                origin = pd.Timestamp(manifest["origin"])
+                console.print(f"Resuming {asset} export from {resume_hour}")
+                start_date = resume_hour.to_pydatetime()
+            else:
+                resume_hour, resume_skip, cut = pd.Timestamp(start_date), 0, pd.Timestamp(start_date)
+                origin = None
+                manifest = {"start": asset_start}
 
-            filenames.append(Path(f"{download_path}{asset}/{year}/{month:0>2}/{day:0>2}/{hour:0>2}h_ticks.bi5"))
-            file_times.append(datetime(year, month+1, day, hour))
+            with metrics.stage("scan", asset):
+                # Sizes of the hours the inventory knows are present, the others are stat'ed
+                file_sizes = []
+                packs = month_pack.PackedAsset(f"{download_path}{asset}")
+                known = inv.hours(asset, start_date, end_date)
+                for date in calendar.hours(start_date, end_date):
+                    status, size = known.get(inventory.hour_key(date), (None, None))
+                    if status == inventory.EMPTY:
+                        continue
+                    year = date.year
+                    month = date.month-1
+                    day = date.day
+                    hour = date.hour
 
-            start_date += delta
+                    packed = packs.lookup(date)
+                    if packed is not None:
+                        filenames.append(packed)
+                        file_sizes.append(packed.size)
+                        if packed.size and status != inventory.PRESENT:
+                            inv.record(asset, date, inventory.PRESENT, packed.size)
+                    else:
+                        filenames.append(Path(f"{download_path}{asset}/{year}/{month:0>2}/{day:0>2}/{hour:0>2}h_ticks.bi5"))
+                        file_sizes.append(size if status == inventory.PRESENT else None)
+                    file_times.append(datetime(year, month+1, day, hour))
 
-        df_list = []
-        found_first_file = False
-        missing_count = 0
-        missing_start_date = None
+                tick_files = []
+                tick_times = []
+                found_first_file = False
+                missing_count = 0
+                missing_start_date = None
+                last_found = None
         
-        for i in track(range(len(filenames)), description=f"Reading {asset} tick files..."):
-            file = filenames[i]
-            if not file.is_file():
-                if not found_first_file:
-                    if missing_count == 0:
-                        missing_start_date = file_times[i]
-                    missing_count += 1
-                else:
-                    print(f"{file} is missing, skipping this file.")
-                continue
+                for i in progress_track(range(len(filenames)), description=f"Scanning {asset} tick files..."):
+                    file = filenames[i]
+                    size = file_sizes[i]
+                    if size is None and file.is_file():
+                        size = file.stat().st_size
+                        if size:
+                            inv.record(asset, file_times[i], inventory.PRESENT, size)
+                    if size is None:
+                        if not found_first_file:
+                            if missing_count == 0:
+                                missing_start_date = file_times[i]
+                            missing_count += 1
+                        else:
+                            print(f"{file} is missing, skipping this file.")
+                            inv.record(asset, file_times[i], inventory.MISSING)
+                        continue
             
-            if missing_count > 0 and not found_first_file:
-                print(f"{missing_count} files missing from {missing_start_date.strftime('%Y-%m-%d %H:00')} to {file_times[i-1].strftime('%Y-%m-%d %H:00')}")
-                missing_count = 0
+                    if missing_count > 0 and not found_first_file:
+                        print(f"{missing_count} files missing from {missing_start_date.strftime('%Y-%m-%d %H:00')} to {file_times[i-1].strftime('%Y-%m-%d %H:00')}")
+                        missing_count = 0
             
-            found_first_file = True
+                    found_first_file = True
+                    last_found = pd.Timestamp(file_times[i])
             
-            if file.stat().st_size == 0:
-                continue
-                
-            dt = np.dtype([('TIME', '>i4'), ('ASKP', '>i4'), ('BIDP', '>i4'), ('ASKV', '>f4'), ('BIDV', '>f4')])
-            data = np.frombuffer(lzma.open(file, mode="rb").read(),dt)
-            df = pd.DataFrame(data)
-            df["TIME"] = pd.to_datetime(df["TIME"], unit="ms", origin=file_times[i])
-            df_list.append(df)
-
-        # Handle case where all files are missing
-        if missing_count > 0 and not found_first_file:
-            print(f"{missing_count} files missing from {missing_start_date.strftime('%Y-%m-%d %H:00')} to {file_times[-1].strftime('%Y-%m-%d %H:00')}")
-
-        if not df_list:
-            print(f"No data found for {asset}")
-            continue
+                    if size == 0:
+                        inv.mark_empty(asset, file_times[i])
+                        continue
 
-        df = pd.concat(df_list, ignore_index=True)
-        df["ASKP"] = df["ASKP"].astype(np.int32)
-        df["BIDP"] = df["BIDP"].astype(np.int32)
-        df["ASKV"] = df["ASKV"].astype(np.float32)
-        df["BIDV"] = df["BIDV"].astype(np.float32)
+                    tick_files.append(file)
+                    tick_times.append(file_times[i])
 
-        df["ASKP"] = df["ASKP"] / 100_000
-        df["BIDP"] = df["BIDP"] / 100_000
+            # Handle case where all files are missing
+            if missing_count > 0 and not found_first_file:
+                print(f"{missing_count} files missing from {missing_start_date.strftime('%Y-%m-%d %H:00')} to {file_times[-1].strftime('%Y-%m-%d %H:00')}")
 
-        with console.status(f"Aggregating {asset} data...") as status:
-            agg_df = aggregate_data(df, timeframe)
-            console.print(f"{asset} data aggregated")
-            status.update(f"Exporting {asset} to file...")
+            if not tick_files:
+                print(f"No data found for {asset}")
+                continue
 
             export_file.parent.mkdir(exist_ok=True, parents=True)
-            agg_df.to_csv(export_file, index=False)
+            # Full exports are built next to the output and swapped in at the end
+            target = export_file if resume is not None else export_file.with_name(export_file.name + ".tmp")
+            if resume is None:
+                _remove_output(target)
+            replace_from = cut if resume is not None else None
+            # An incremental run only counts the bytes it grew the output by
+            size_before = metrics.output_size(export_file) if resume is not None else 0
+            aggregator = None
+            skip = resume_skip
+
+            def write_bars(bars):
+                nonlocal replace_from
+                if bars is None or not len(bars):
+                    return
+                if resume is not None:
+                    bars = bars[bars["date"] >= cut]
+                with metrics.stage("write", asset):
+                    if replace_from is not None:
+                        incremental.replace_tail(bars, target, replace_from, output_format)
+                        replace_from = None
+                    else:
+                        incremental.append(bars, target, output_format)
+
+            cache_writer = None
+            if write_tick_cache:
+                cache_root = tick_cache.cache_path(export_path, asset)
+                cache_writer = tick_cache.TickCacheWriter(cache_root, asset_start, resume_hour if resume is not None else None)
+
+            chunks = _tick_chunks(tick_files, tick_times, chunk)
+            try:
+                for chunk_files, chunk_times in progress_track(chunks, description=f"Exporting {asset}..."):
+                    with metrics.stage("decode", asset):
+                        columns = bi5.decode_files(chunk_files, bi5.hour_ms(chunk_times), workers, show_progress=False)
+                    metrics.count("files_decoded", len(chunk_files), asset)
+                    metrics.count("ticks_decoded", len(columns["TIME"]), asset)
+                    for time, count in zip(chunk_times, columns["COUNT"]):
+                        inv.record(asset, time, inventory.PRESENT, ticks=int(count))
+                    if cache_writer is not None:
+                        with metrics.stage("tick_cache", asset):
+                            cache_writer.append(columns)
+                    with metrics.stage("frame", asset):
+                        df = _ticks_frame(columns)
+                    if skip:
+                        # Drop the ticks of the resume hour that belong to already complete tick bars
+                        df = df.iloc[skip:].reset_index(drop=True)
+                        skip = 0
+                    if not len(df):
+                        continue
+                    if aggregator is None:
+                        if origin is None:
+                            origin = df["TIME"].iloc[0].floor("D")
+                        aggregator = StreamingAggregator(timeframe, origin)
+                    with metrics.stage("aggregate", asset):
+                        completed = aggregator.push(df)
+                    write_bars(completed)
+            except BaseException:
+                if cache_writer is not None:
+                    cache_writer.abort()
+                raise
+
+            if aggregator is None:
+                print(f"No data found for {asset}")
+                if cache_writer is not None:
+                    cache_writer.abort()
+                continue
+            with metrics.stage("aggregate", asset):
+                completed = aggregator.flush()
+            write_bars(completed)
+            if cache_writer is not None:
+                cache_writer.close(last_found)
+            if resume is None:
+                _remove_output(export_file)
+                os.replace(target, export_file)
+            metrics.count("output_bytes", max(0, metrics.output_size(export_file) - size_before), asset)
             console.print(f"{asset} exported to {export_file}")
 
+            incremental.record_change(manifest, cut)
+            next_hour, next_skip, next_cut = _next_resume_point(aggregator, timeframe, origin, last_found, resume_hour, resume_skip)
+            manifest.update({
+                "origin": origin.isoformat(),
+                "last_hour": last_found.isoformat(),
+                "resume_hour": next_hour.isoformat(),
+                "resume_skip": next_skip,
+                "cut": next_cut.isoformat(),
+            })
+            incremental.save_manifest(export_file, manifest)
+
     print(f"Export completed. Data located at {Path(export_path).resolve()}")
 
 
-def aggregate_data(df:pd.DataFrame, tf:str):
-    if "t" in tf:
-        tick_num = int(tf.split("t")[0])
-        if tick_num == 1:
-            return df.rename(columns={
-                "TIME": "date",
-                "BIDP": "bid",
-                "ASKP": "ask", 
-                "BIDV": "bid_volume", 
-                "ASKV": "ask_volume"
-            })[["date", "bid", "ask", "bid_volume", "ask_volume"]]
-        
-        df_group = df.groupby(df.index // tick_num)
-        agg_df = pd.DataFrame()
-        agg_df["date"] = df_group["TIME"].first()
-        agg_df["open"] = df_group["BIDP"].first()
-        agg_df["high"] = df_group["BIDP"].max()
-        agg_df["low"] = df_group["BIDP"].min()
-        agg_df["close"] = df_group["BIDP"].last()
-        agg_df["vol"] = df_group["BIDV"].sum()
-
-        # extra insights
-        agg_df["ao"] = df_group["ASKP"].first()
-        agg_df["ah"] = df_group["ASKP"].max()
-        agg_df["al"] = df_group["ASKP"].min()
-        agg_df["ac"] = df_group["ASKP"].last()
-        agg_df["av"] = df_group["ASKV"].sum()
-        agg_df["tv"] = df_group["ASKV"].count()
-
-        return agg_df
-
-    agg_time = pd.Timedelta(tf)
-
-    df = df.set_index("TIME")
-    df_group = df.resample(agg_time)
-
-    agg_df = pd.DataFrame()
-    agg_df["open"] = df_group["BIDP"].first()
-    agg_df["high"] = df_group["BIDP"].max()
-    agg_df["low"] = df_group["BIDP"].min()
-    agg_df["close"] = df_group["BIDP"].last()
-    agg_df["vol"] = df_group["BIDV"].sum()
-
-    # extra insights
-    agg_df["ao"] = df_group["ASKP"].first()
-    agg_df["ah"] = df_group["ASKP"].max()
-    agg_df["al"] = df_group["ASKP"].min()
-    agg_df["ac"] = df_group["ASKP"].last()
-    agg_df["av"] = df_group["ASKV"].sum()
-    agg_df["tv"] = df_group["ASKV"].count()
-
-    agg_df = agg_df.reset_index(names="date")
-
-    agg_df = agg_df.dropna()
-    return agg_df
+def _bar_floor(date:pd.Timestamp, tf:str, origin:pd.Timestamp):
+    """Start of the tf time bar containing date, for bars aligned on origin"""
+    step = pd.Timedelta(tf)
+    return origin + ((date - origin) // step) * step
+
+
+def _earliest_changed_day(download_path:str, asset:str, start:datetime, end:datetime, since:float):
+    """First day directory in [start, end) modified after the since timestamp.
+
+    A month packed (or repacked) since counts as changed from its first day.
+    """
+    day = start.replace(hour=0)
+    while day < end:
+        if day == start.replace(hour=0) or day.day == 1:
+            pack_file = month_pack.month_dir(f"{download_path}{asset}", day.year, day.month) / month_pack.PACK_NAME
+            if pack_file.exists() and pack_file.stat().st_mtime > since:
+                return pd.Timestamp(day)
+        day_dir = Path(f"{download_path}{asset}/{day.year}/{day.month-1:0>2}/{day.day:0>2}")
+        if day_dir.exists() and day_dir.stat().st_mtime > since:
+            return pd.Timestamp(day)
+        day += timedelta(days=1)
+    return None
+
+
+def _resume_point(manifest:dict, download_path:str, asset:str, tf:str, start:datetime):
+    """Return (resume_hour, resume_skip, cut) for an incremental export, or None to rebuild everything"""
+    resume_hour = pd.Timestamp(manifest["resume_hour"])
+    changed = _earliest_changed_day(download_path, asset, start, resume_hour.floor("D").to_pydatetime(), manifest["updated_at"])
+    if changed is None:
+        return resume_hour, manifest["resume_skip"], pd.Timestamp(manifest["cut"])
+    if tf != "1t" and bars.parse(tf)[0] != bars.TIME:
+        # Tick, volume and range bar boundaries depend on every earlier tick
+        return None
+    if tf != "1t":
+        changed = _bar_floor(changed, tf, pd.Timestamp(manifest["origin"]))
+    return changed.floor("h"), 0, changed
+
+
+def _next_resume_point(aggregator, tf:str, origin:pd.Timestamp, last_hour:pd.Timestamp, run_hour:pd.Timestamp, run_skip:int):
+    """Where the next incremental export restarts: the last hour, or the start of the bar still open"""
+    if tf == "1t":
+        return last_hour, 0, last_hour
+    if bars.parse(tf)[0] == bars.TIME:
+        cut = _bar_floor(last_hour, tf, origin)
+        return cut.floor("h"), 0, cut
+
+    if aggregator.open_bar is None:
+        next_hour = last_hour + pd.Timedelta(hours=1)
+        return next_hour, 0, next_hour
+    hour, skip, cut = aggregator.open_bar
+    if hour == run_hour:
+        skip += run_skip
+    return hour, skip, cut
+
+
+def _tick_chunks(tick_files:list, tick_times:list, chunk:str):
+    """Split the hour files into consecutive (files, times) chunks of one day or month"""
+    if chunk == "day":
+        key = lambda t: (t.year, t.month, t.day)
+    else:
+        key = lambda t: (t.year, t.month)
+    chunks = []
+    for file, time in zip(tick_files, tick_times):
+        if not chunks or key(chunks[-1][1][-1]) != key(time):
+            chunks.append(([], []))
+        chunks[-1][0].append(file)
+        chunks[-1][1].append(time)
+    return chunks
+
+
+def _ticks_frame(columns:dict) -> pd.DataFrame:
+    return pd.DataFrame({
+        "TIME": pd.to_datetime(columns["TIME"], unit="ms"),
+        "ASKP": columns["ASKP"] / 100_000,
+        "BIDP": columns["BIDP"] / 100_000,
+        "ASKV": columns["ASKV"],
+        "BIDV": columns["BIDV"],
+    })
+
+
+def _remove_output(path) -> None:
+    """Delete a CSV file or Parquet dataset directory if it exists"""
+    if not path.exists():
+        return
+    if path.is_dir():
+        shutil.rmtree(path)
+    else:
+        path.unlink()
+
+
+class StreamingAggregator:
+    """aggregate_data over ticks fed in consecutive chunks.
+
+    The ticks of the bar still open at the end of a chunk are carried into
+    the next chunk, so push() on every chunk followed by flush() gives the
+    bars of aggregate_data on all ticks at once while holding only one chunk
+    in memory.
+    """
+
+    def __init__(self, tf:str, origin:pd.Timestamp):
+        self.tf = tf
+        self.origin = origin
+        self.unit, self.size = (None, None) if tf == "1t" else bars.parse(tf)
+        self.carry = None
+        # (hour, ticks of that hour before the bar, bar date) of the open tick, volume or range bar
+        self.open_bar = None
+
+    def push(self, df:pd.DataFrame):
+        """Add the next chunk of ticks and return the bars it completes (or None)"""
+        if self.unit is None:
+            return aggregate_data(df, self.tf)
+        carried = 0
+        if self.carry is not None and len(self.carry):
+            carried = len(self.carry)
+            df = pd.concat([self.carry, df], ignore_index=True)
+
+        ticks = bars.tick_arrays(df)
+        starts, labels, closed = bars.bar_starts(ticks, self.unit, self.size, self.origin)
+        done = len(starts) if closed else len(starts) - 1
+        split = len(df) if closed else int(starts[-1])
+        if self.unit != bars.TIME:
+            if split == len(df):
+                self.open_bar = None
+            elif split >= carried:
+                # Hour files are never split across chunks, so the whole hour is in df
+                times = df["TIME"]
+                bar_date = times.iloc[split]
+                hour = bar_date.floor("h")
+                self.open_bar = (hour, split - int(times.searchsorted(hour)), bar_date)
+
+        self.carry = df.iloc[split:].reset_index(drop=True)
+        if done == 0:
+            return None
+        return bars.reduce(ticks, starts[:done], labels[:done], split)
+
+    def flush(self):
+        """Return the bar still open after the last chunk (or None)"""
+        carry, self.carry = self.carry, None
+        if carry is None or not len(carry):
+            return None
+        return aggregate_data(carry, self.tf, self.origin)
+
+
+def aggregate_data(df:pd.DataFrame, tf:str, origin="start_day"):
+    if tf == "1t":
+        return df.rename(columns={
+            "TIME": "date",
+            "BIDP": "bid",
+            "ASKP": "ask", 
+            "BIDV": "bid_volume", 
+            "ASKV": "ask_volume"
+        })[["date", "bid", "ask", "bid_volume", "ask_volume"]]
+
+    # bid OHLC (open, high, low, close, vol), ask OHLC (ao, ah, al, ac, av) and tick count (tv) in one pass
+    return bars.aggregate(df, tf, origin)
 
 @app.command("list")
-def list_command(mode:Annotated[str, typer.Option(help="Mode: 'recent' or 'full' - determines which directories to use")]="full"):
+def list_command(mode:Annotated[str, typer.Option(help="Mode: 'recent' or 'full' - both use the same store")]="full"):
     """
     List all downloaded assets
     """
-    assets = grab_asset_dirs(mode)
+    download_path, _ = get_paths(mode)
+    with inventory.for_download_path(download_path) as inv:
+        coverage = [row for row in inv.coverage() if row["first"] is not None]
 
     table = Table(title="Downloaded Data")
 
     table.add_column("Asset")
     table.add_column("Start Date (YYYY-MM-DD)")
     table.add_column("End Date (YYYY-MM-DD)")
+    table.add_column("Hours", justify="right")
+    table.add_column("Missing", justify="right")
+    table.add_column("Failed", justify="right")
+    table.add_column("Size (MB)", justify="right")
 
-    for asset in assets:
-        table.add_row(asset, min(assets[asset]).strftime("%Y-%m-%d"), max(assets[asset]).strftime("%Y-%m-%d"))
+    for row in coverage:
+        table.add_row(row["symbol"], row["first"].strftime("%Y-%m-%d"), row["last"].strftime("%Y-%m-%d"),
+                      str(row[inventory.PRESENT]), str(row[inventory.MISSING]), str(row[inventory.FAILED]),
+                      f"{row['bytes'] / 1e6:.1f}")
 
     console = Console()
     console.print(table)
-    console.print(f"Total Number of Assets: {len(assets)}")
+    console.print(f"Total Number of Assets: {len(coverage)}")
+    if not coverage:
+        console.print("The inventory is empty, run reindex to build it from the downloaded files")
+
+@app.command()
+def reindex(assets:Annotated[list[str], typer.Argument(help="Give a list of assets to reindex. Use 'all' for every asset directory. Eg. EURUSD AUDUSD")],
+            mode:Annotated[str, typer.Option(help="Mode: 'recent' or 'full' - both use the same store")]="full",
+            ticks:Annotated[bool, typer.Option(help="Also decompress every file to record its tick count")]=False,
+            workers:Annotated[int, typer.Option(help="Number of threads decompressing tick files (defaults to the number of CPUs)")]=os.cpu_count()):
+    """
+    Rebuild the inventory of downloaded hours from the files on disk
+    """
+    download_path, _ = get_paths(mode)
+    if assets[0] == "all":
+        assets = sorted(entry.name for entry in os.scandir(download_path) if entry.is_dir())
+
+    calendar = TradingCalendar()
+    with inventory.for_download_path(download_path) as inv:
+        for asset in assets:
+            files = _scan_hour_files(Path(f"{download_path}{asset}"))
+            inv.clear(asset)
+            empty = {key for key, (status, _) in inv.hours(asset, datetime.min, datetime.max).items() if status == inventory.EMPTY}
+            # Empty hours cache of earlier versions
+            legacy_empty = Path(f"{download_path}{asset}/empty_hours.json")
+            if legacy_empty.exists():
+                with open(legacy_empty) as f:
+                    for key in json.load(f):
+                        inv.record(asset, inventory.key_hour(key), inventory.EMPTY, 0, 0)
+                        empty.add(key)
+                legacy_empty.unlink()
+
+            present = [(date, file, size) for date, (file, size) in files.items() if size]
+            counts = [None] * len(present)
+            if ticks:
+                with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                    results = executor.map(lambda item: len(bi5.read_records(item[1])), present)
+                    counts = list(progress_track(results, total=len(present), description=f"Counting {asset} ticks..."))
+            for (date, _, size), count in zip(present, counts):
+                inv.record(asset, date, inventory.PRESENT, size, count)
+            for date, (_, size) in files.items():
+                if not size:
+                    inv.mark_empty(asset, date)
+                    empty.add(inventory.hour_key(date))
+
+            missing = 0
+            if present:
+                first, last = min(present)[0], max(present)[0]
+                for date in calendar.hours(first, last):
+                    if date not in files and inventory.hour_key(date) not in empty:
+                        inv.record(asset, date, inventory.MISSING)
+                        missing += 1
+            print(f"{asset}: {len(present)} hours present, {len(files) - len(present)} empty files, {missing} missing")
+    print("Reindex completed")
+
+def _scan_hour_files(asset_dir:Path) -> dict:
+    """Return {hour: (path, size)} for every .bi5 file under an asset directory.
+
+    Packed hours are returned as month_pack.PackedHour instead of a path, unless an hour file overrides them.
+    """
+    files = {}
+    if not asset_dir.is_dir():
+        return files
+    for year_dir in os.scandir(asset_dir):
+        if not (year_dir.is_dir() and year_dir.name.isdigit()):
+            continue
+        for month_dir in os.scandir(year_dir.path):
+            files.update(_scan_month_files(Path(month_dir.path), int(year_dir.name), int(month_dir.name)+1))
+    return files
+
+def _scan_month_files(month_dir:Path, year:int, month:int) -> dict:
+    """_scan_hour_files for the directory of one month (1-based)"""
+    files = {}
+    pack_file = month_dir / month_pack.PACK_NAME
+    if pack_file.is_file():
+        packed = month_pack.read_pack(pack_file, year, month)
+        files.update((date, (hour, hour.size)) for date, hour in packed.items())
+    for day_dir in os.scandir(month_dir):
+        if not day_dir.is_dir():
+            continue
+        for entry in os.scandir(day_dir.path):
+            if not entry.name.endswith("h_ticks.bi5"):
+                continue
+            date = datetime(year, month, int(day_dir.name), int(entry.name[:2]))
+            files[date] = (Path(entry.path), entry.stat().st_size)
+    return files
+
+REPAIR_LIST = "repair_list.json"
+
+@app.command()
+def verify(assets:Annotated[list[str], typer.Argument(help="Give a list of assets to verify. Use 'all' for every asset directory. Eg. EURUSD AUDUSD")],
+           mode:Annotated[str, typer.Option(help="Mode: 'recent' or 'full' - both use the same store")]="full",
+           workers:Annotated[int, typer.Option(help="Number of processes checking files (defaults to the number of CPUs)")]=os.cpu_count()):
+    """
+    Check every downloaded hour, in hour files and packed months, and list the broken ones for repair.\n
+    A file is broken if its LZMA stream does not decode fully, its payload is not whole 20 byte records,
+    its tick times are out of order or outside the hour, or its prices or volumes are implausible.
+    The broken hours are written to repair_list.json in the download directory, for the repair command.
+    """
+    download_path, _ = get_paths(mode)
+    if assets[0] == "all":
+        assets = sorted(entry.name for entry in os.scandir(download_path) if entry.is_dir())
+
+    hours = []
+    for asset in assets:
+        hours.extend((asset, date, file) for date, (file, _) in sorted(_scan_hour_files(Path(f"{download_path}{asset}")).items()))
+
+    broken = []
+    checked = {asset: 0 for asset in assets}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        problems = executor.map(bi5.check_file, [file for _, _, file in hours], chunksize=256)
+        for (asset, date, file), problem in zip(hours, progress_track(problems, total=len(hours), description="Verifying tick files...")):
+            checked[asset] += 1
+            if problem is not None:
+                broken.append({"symbol": asset, "hour": date.isoformat(), "path": str(file), "problem": problem})
+
+    # Entries of assets that were not verified this time are kept
+    list_path = Path(f"{download_path}{REPAIR_LIST}")
+    entries = [entry for entry in _load_repair_list(list_path) if entry["symbol"] not in checked] + broken
+    _save_repair_list(list_path, entries)
+
+    for asset in assets:
+        asset_broken = [entry for entry in broken if entry["symbol"] == asset]
+        print(f"{asset}: {checked[asset]} files checked, {len(asset_broken)} broken")
+        for entry in asset_broken[:10]:
+            print(f"  {entry['hour']}: {entry['problem']}")
+        if len(asset_broken) > 10:
+            print(f"  ... and {len(asset_broken) - 10} more")
+    print(f"{len(entries)} hours to repair listed in {list_path}")
+
+@app.command()
+def repair(mode:Annotated[str, typer.Option(help="Mode: 'recent' or 'full' - both use the same store")]="full",
+           concurrent:Annotated[int, typer.Option(help="Max number of concurrent downloads (defaults to 3)")]=3,
+           rate:Annotated[float, typer.Option(help="Max requests per second (0 for no limit)")]=0,
+           retries:Annotated[int, typer.Option(help="Retries with exponential backoff on 5xx responses and timeouts")]=5):
+    """
+    Re-download the hours listed by verify, then check them again.\n
+    Hours that are still broken stay in the repair list.
+    """
+    download_path, _ = get_paths(mode)
+    list_path = Path(f"{download_path}{REPAIR_LIST}")
+    entries = _load_repair_list(list_path)
+    if not entries:
+        print(f"Nothing to repair in {list_path}, run verify first")
+        return
+
+    # Repaired hours are written as hour files, which override a packed hour until the month is packed again
+    jobs = [(entry["symbol"], datetime.fromisoformat(entry["hour"])) for entry in entries]
+
+    with Downloader(concurrent, rate, retries) as downloader_pool, inventory.for_download_path(download_path) as inv:
+        download_file_parallel(jobs, f"{len(jobs)} broken hours", downloader_pool, inv, download_path, force=True)
+
+        remaining = []
+        for entry, (asset, date) in zip(entries, jobs):
+            file, _ = hour_file(download_path, asset, date)
+            problem = bi5.check_file(file)
+            if problem is None:
+                continue
+            status = inv.hours(asset, date, date).get(inventory.hour_key(date), (None,))[0]
+            if status == inventory.EMPTY:
+                # The server has no ticks for this hour, so the broken file is dropped
+                file.unlink()
+                continue
+            remaining.append({**entry, "problem": problem})
+
+    _save_repair_list(list_path, remaining)
+    print(f"{len(entries) - len(remaining)} hours repaired, {len(remaining)} still broken")
+
+@app.command()
+def pack(assets:Annotated[list[str], typer.Argument(help="Give a list of assets to pack. Use 'all' for every asset directory. Eg. EURUSD AUDUSD")],
+         mode:Annotated[str, typer.Option(help="Mode: 'recent' or 'full' - both use the same store")]="full",
+         solid:Annotated[bool, typer.Option(help="Recompress each month as one LZMA stream: smaller, but reading any hour decompresses the month")]=False,
+         workers:Annotated[int, typer.Option(help="Number of processes packing months (defaults to the number of CPUs)")]=os.cpu_count()):
+    """
+    Pack the hour files of closed months into one ticks.bi5pack file per asset and month.\n
+    Packs keep each hour's compressed data and an index, so export, verify and reindex read them like hour files.
+    Hour files added to a packed month (eg. by repair) are merged in the next time it is packed.
+    Hour files that do not decode are left in place for verify and repair.
+    """
+    download_path, _ = get_paths(mode)
+    if assets[0] == "all":
+        assets = sorted(entry.name for entry in os.scandir(download_path) if entry.is_dir())
+
+    months = []
+    for asset in assets:
+        asset_dir = Path(f"{download_path}{asset}")
+        if not asset_dir.is_dir():
+            print(f"No data found for {asset}")
+            continue
+        for year_dir in os.scandir(asset_dir):
+            if not (year_dir.is_dir() and year_dir.name.isdigit()):
+                continue
+            for month_dir in os.scandir(year_dir.path):
+                year, month = int(year_dir.name), int(month_dir.name)+1
+                if month_dir.is_dir() and month_pack.is_closed(year, month):
+                    months.append((asset, year, month))
+    months.sort()
+
+    totals = {asset: [0, 0, 0, 0] for asset in assets}
+    broken = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor, inventory.for_download_path(download_path) as inv:
+        futures = [executor.submit(month_pack.pack_month, f"{download_path}{asset}", year, month, solid) for asset, year, month in months]
+        for (asset, year, month), future in zip(months, progress_track(futures, description="Packing months...")):
+            hours, month_broken, before, after = future.result()
+            if hours:
+                # The hour files are gone, so download only knows the packed hours from the inventory
+                pack_file = month_pack.month_dir(f"{download_path}{asset}", year, month) / month_pack.PACK_NAME
+                for date, packed in month_pack.read_pack(pack_file, year, month).items():
+                    _record_packed(inv, asset, date, packed)
+            total = totals[asset]
+            total[0] += hours > 0
+            total[1] += hours
+            total[2] += before
+            total[3] += after
+            broken.extend(month_broken)
+
+    for asset, (packed_months, hours, before, after) in totals.items():
+        print(f"{asset}: {packed_months} months packed ({hours} hours), {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB")
+    for file in broken:
+        print(f"{file} does not decode and was not packed, run verify and repair")
+
+@app.command()
+def migrate():
+    """
+    Merge the recent/ and full/ trees of earlier versions into the shared store.\n
+    Months and exports the store does not have yet are moved into it. Hours of a month it already has are moved
+    one by one unless the store has them too, and an export is only replaced by one built from an earlier start.
+    Whatever is left in the old trees is a duplicate and is removed.
+    """
+    base_path = get_base_path()
+    download_path, export_path = get_paths()
+    for legacy in modes.LEGACY_DIRS:
+        legacy_path = Path(f"{base_path}{legacy}")
+        if not legacy_path.is_dir():
+            continue
+        moved_months = moved_hours = moved_outputs = 0
+
+        legacy_download = legacy_path / "download"
+        if legacy_download.is_dir():
+            legacy_inventory = legacy_download / inventory.FILE_NAME
+            if legacy_inventory.exists():
+                with inventory.for_download_path(download_path) as inv:
+                    inv.merge(legacy_inventory)
+            for asset_dir in sorted(os.scandir(legacy_download), key=lambda entry: entry.name):
+                if not asset_dir.is_dir():
+                    continue
+                for year_dir in os.scandir(asset_dir.path):
+                    if not (year_dir.is_dir() and year_dir.name.isdigit()):
+                        continue
+                    for month_dir in os.scandir(year_dir.path):
+                        target = Path(f"{download_path}{asset_dir.name}/{year_dir.name}/{month_dir.name}")
+                        if not target.exists():
+                            target.parent.mkdir(parents=True, exist_ok=True)
+                            os.replace(month_dir.path, target)
+                            moved_months += 1
+                        else:
+                            moved_hours += _migrate_month(Path(month_dir.path), target, int(year_dir.name), int(month_dir.name)+1)
+
+        legacy_export = legacy_path / "resampled"
+        if legacy_export.is_dir():
+            for asset_dir in sorted(os.scandir(legacy_export), key=lambda entry: entry.name):
+                if asset_dir.is_dir():
+                    moved_outputs += _migrate_outputs(Path(asset_dir.path), Path(f"{export_path}{asset_dir.name}"))
+
+        duplicates = metrics.output_size(legacy_path)
+        shutil.rmtree(legacy_path)
+        print(f"{legacy}: {moved_months} months and {moved_hours} hours moved, {moved_outputs} outputs moved, "
+              f"{duplicates / 1e6:.1f} MB of duplicates removed")
+    print(f"Store: {download_path} and {export_path}")
+
+def _migrate_month(source:Path, target:Path, year:int, month:int) -> int:
+    """Move the hours of a month the store does not have (or only has as empty) into its directory"""
+    existing = _scan_month_files(target, year, month)
+    moved = 0
+    for date, (hour, size) in _scan_month_files(source, year, month).items():
+        if date in existing and (existing[date][1] or not size):
+            continue
+        filename = target / f"{date.day:0>2}" / f"{date.hour:0>2}h_ticks.bi5"
+        filename.parent.mkdir(parents=True, exist_ok=True)
+        if isinstance(hour, month_pack.PackedHour):
+            tmp_file = filename.with_name(filename.name + ".part")
+            tmp_file.write_bytes(month_pack.hour_blob(hour))
+            os.replace(tmp_file, filename)
+        else:
+            os.replace(hour, filename)
+        moved += 1
+    return moved
+
+def _migrate_outputs(source:Path, target:Path) -> int:
+    """Move the exports, resampled files and caches of an asset the store has not built from an earlier start"""
+    target.mkdir(parents=True, exist_ok=True)
+    moved = 0
+    names = {name.removesuffix(".manifest.json") for name in os.listdir(source)}
+    for name in sorted(names):
+        # An output and its manifest are moved together
+        paths = [name, name + ".manifest.json"]
+        source_manifest = incremental.load_manifest(source / name)
+        target_manifest = incremental.load_manifest(target / name)
+        if any((target / path).exists() for path in paths):
+            source_start = (source_manifest or {}).get("start")
+            target_start = (target_manifest or {}).get("start")
+            if source_start is None or target_start is None or source_start >= target_start:
+                continue
+        for path in paths:
+            if (target / path).is_dir():
+                shutil.rmtree(target / path)
+            if (source / path).exists():
+                os.replace(source / path, target / path)
+            elif (target / path).exists():
+                (target / path).unlink()
+        moved += 1
+    return moved
+
+def _load_repair_list(path:Path) -> list:
+    if not path.exists():
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+def _save_repair_list(path:Path, entries:list) -> None:
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(entries, f, indent=2)
+    os.replace(tmp_path, path)
 
 @app.command()
 def update(assets:Annotated[list[str], typer.Argument(help="Give a list of assets to update. Use 'all' for all downloaded assets. Eg. EURUSD AUDUSD. Check update --help for more info")],
            start:Annotated[str, typer.Option(help="Start date to update from in YYYY-MM-DD format. This overrides the default which uses the latest downloaded file as the start date. Eg. 2024-01-08")]="",
-           concurrent:Annotated[int, typer.Option(help="Max number of concurrent downloads (defaults to 3)")]=3,
+           concurrent:Annotated[int, typer.Option(help="Max number of concurrent downloads across all assets (defaults to 3)")]=3,
            force:Annotated[bool, typer.Option(help="Redownload files. By default, without this flag, files that already exist will be skipped. This can be used with --start to force redownload.")]=False,
-           mode:Annotated[str, typer.Option(help="Mode: 'recent' or 'full' - determines which directories to use")]="full"):
+           mode:Annotated[str, typer.Option(help="Mode: 'recent' or 'full' - both use the same store")]="full",
+           rate:Annotated[float, typer.Option(help="Max requests per second across all assets (0 for no limit)")]=0,
+           retries:Annotated[int, typer.Option(help="Retries with exponential backoff on 5xx responses and timeouts")]=5):
     """
     Update downloaded assets to latest date.\n
     assets can be selected by listing multiple with a space dividing them or a single asset.\n
@@ -330,35 +950,199 @@ def update(assets:Annotated[list[str], typer.Argument(help="Give a list of asset
     Can also use all to select all downloaded assets.\n
     Eg. export all\n
     """
-    assets_dict = grab_asset_dirs(mode)
-    if assets[0] != "all":
+    download_path, _ = get_paths(mode)
+    end_date = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(hours=1)
+    asset_starts = []
+    with inventory.for_download_path(download_path) as inv:
+        if assets[0] == "all":
+            assets = inv.symbols()
         for asset in assets:
-            start_date = max(assets_dict[asset])
+            start_date = inv.last_hour(asset)
             if start != "":
                 start_split = start.split("-")
                 start_date = datetime(int(start_split[0]), int(start_split[1]), int(start_split[2]))
-            download([asset], start_date.strftime("%Y-%m-%d"), concurrent=concurrent, force=force, mode=mode)
+            if start_date is None:
+                print(f"No downloaded hours of {asset} in the inventory, skipping it (use --start or reindex)")
+                continue
+            asset_starts.append((asset, start_date))
+    if not asset_starts:
         return
 
-    for asset in assets_dict:
-        start_date = max(assets_dict[asset])
-        if start != "":
-            start_split = start.split("-")
-            start_date = datetime(int(start_split[0]), int(start_split[1]), int(start_split[2]))
-        download([asset], start_date.strftime("%Y-%m-%d"), concurrent=concurrent, force=force, mode=mode)
+    with Downloader(concurrent, rate, retries) as downloader_pool:
+        download_assets(asset_starts, end_date, download_path, downloader_pool, force)
+    print("Download completed")
+
+
+@app.command()
+def tail(assets:Annotated[list[str], typer.Argument(help="Give a list of assets to follow. Eg. EURUSD AUDUSD")],
+         timeframes:Annotated[list[str], typer.Option("--timeframe", help="Time bars to keep up to date, repeat for several (eg. --timeframe 1m --timeframe 1h)")]=["1m", "5m", "15m", "1h"],
+         interval:Annotated[float, typer.Option(help="Seconds between two polls of each asset")]=1.0,
+         capacity:Annotated[int, typer.Option(help="Recent bars kept in memory per asset and timeframe")]=1000,
+         port:Annotated[int, typer.Option(help="Publish bar updates as JSON lines to clients of this local TCP port (0 to print them instead)")]=0,
+         duration:Annotated[float, typer.Option(help="Stop after this many seconds (0 to run until interrupted)")]=0,
+         rate:Annotated[float, typer.Option(help="Max requests per second across all assets (0 for no limit)")]=0,
+         grace:Annotated[float, typer.Option(help="Seconds an ended hour is still polled for ticks published late, unless its file is served unchanged first")]=600):
+    """
+    Follow the hour being written and keep the open bar of every timeframe up to date.\n
+    Each poll only decodes the ticks added since the previous one, so bars lag the feed by at most the poll interval.
+    """
+    for timeframe in timeframes:
+        if bars.parse(timeframe)[0] != bars.TIME:
+            raise typer.BadParameter(f"tail only builds time bars, got {timeframe}")
+    console = Console()
+    with Downloader(len(assets), rate, retries=0) as downloader_pool:
+        live_tail = live.LiveTail(assets, timeframes, downloader_pool, capacity, grace)
+        publisher = None
+        if port:
+            publisher = live.SocketPublisher(port)
+            live_tail.subscribe(publisher)
+            console.print(f"Publishing bars on {publisher.address[0]}:{publisher.address[1]}")
+        else:
+            live_tail.subscribe(lambda bar: console.print(
+                f"{bar['symbol']} {bar['timeframe']} {bar['date']} O {bar['open']} H {bar['high']} L {bar['low']} C {bar['close']} ({bar['tv']} ticks)"))
+        try:
+            live_tail.run(interval, duration)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if publisher is not None:
+                publisher.close()
+
+
+@app.command("bar-cache")
+def serve_bar_cache(memory:Annotated[int, typer.Option(help="Memory budget of the cached series in MB")]=2048,
+                    port:Annotated[int, typer.Option(help="Local TCP port clients connect to (DUKASCOPY_BAR_CACHE_PORT)")]=bar_cache.DEFAULT_PORT,
+                    directory:Annotated[str, typer.Option(help="Directory of the memory-mapped series (defaults to /dev/shm/dukascopy_bars or DUKASCOPY_BAR_CACHE_DIR)")]=""):
+    """
+    Serve resampled bars to the processes of this machine from shared memory.\n
+    Each symbol and timeframe requested is loaded once into a memory-mapped file that every client maps,
+    reloaded when its resampled file changes, and evicted least recently used first over the memory budget.
+    Clients call main.get_shared_price_df_resampled, which takes the arguments of get_price_df_resampled.
+    """
+    # main.py lives in the project root
+    sys.path.insert(0, str(Path(__file__).parent.parent))
+    import main
+
+    def load(symbol, timeframe, fmt, nocache):
+        return main.get_price_df_resampled(timeframe, symbol, verbose=False, nocache=nocache, mode="full", fmt=fmt)
+
+    def signature(symbol, timeframe, fmt):
+        path = main._resampled_path(main.get_paths(), symbol, timeframe, fmt)
+        return main._source_signature(path) if path.exists() else None
 
+    server = bar_cache.BarCacheServer(load, signature, memory * 2**20, port, directory=directory or None)
+    print(f"Serving bars on {server.address[0]}:{server.address[1]} from {server.directory}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+@app.command()
+def pipeline(mode:Annotated[str, typer.Option(help="Mode: 'recent' (from 2019-01-01) or 'full' (from 2006-01-01)")]="recent",
+             reverse:Annotated[bool, typer.Option(help="Process symbols in reverse order")]=False,
+             only_absent:Annotated[bool, typer.Option(help="Only export if the tick file does not already exist")]=False,
+             incremental_run:Annotated[bool, typer.Option("--incremental", help="Export and resample incrementally")]=False,
+             output_format:Annotated[str, typer.Option("--format", help="Output format: 'csv' or 'parquet'")]="csv",
+             write_tick_cache:Annotated[bool, typer.Option("--tick-cache", help="Also write each symbol's memory-mapped tick cache")]=False,
+             symbols_file:Annotated[str, typer.Option(help="File listing one symbol per line")]=str(Path(__file__).parent.parent / "symbols.txt"),
+             concurrent_downloads:Annotated[int, typer.Option("--concurrent", help="Max number of concurrent downloads")]=8,
+             rate:Annotated[float, typer.Option(help="Max requests per second (0 for no limit)")]=0,
+             retries:Annotated[int, typer.Option(help="Retries with exponential backoff on 5xx responses and timeouts")]=5,
+             export_workers:Annotated[int, typer.Option(help="Number of symbols exported at the same time")]=2,
+             resample_workers:Annotated[int, typer.Option(help="Number of symbols resampled at the same time (in separate processes)")]=2,
+             queue_size:Annotated[int, typer.Option(help="Max symbols waiting between two stages")]=2,
+             start:Annotated[str, typer.Option(help="Start date in YYYY-MM-DD format. Defaults to the start of the mode")]="",
+             end:Annotated[str, typer.Option(help="End date in YYYY-MM-DD format. If not provided, runs until current date Eg. 2024-01-08")]=""):
+    """
+    Download, export (1t) and resample every symbol in one process.\n
+    The stages overlap: while one symbol is exported or resampled, the next ones are already downloading.
+    """
+    global SHOW_PROGRESS
+    SHOW_PROGRESS = False
+    console = Console()
+    with open(symbols_file) as f:
+        symbols = [line.strip() for line in f if line.strip()]
+    if reverse:
+        symbols.reverse()
 
-def grab_asset_dirs(mode: str = "full"):
     download_path, _ = get_paths(mode)
-    dirs = Path(download_path).glob("*/*/*/*")
-    assets = {}
-    for dir in dirs:
-        parts = dir.parts
-        asset = parts[1]
-        if asset not in assets:
-            assets[asset] = []
-        assets[asset].append(datetime(int(parts[2]), int(parts[3])+1, int(parts[4])))
-    return assets
+    start = start or modes.MODE_START_DATES[mode]
+    start_split = start.split("-")
+    start_date = datetime(int(start_split[0]), int(start_split[1]), int(start_split[2]))
+    end_date = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(hours=1)
+    if end != "":
+        end_split = end.split("-")
+        end_date = datetime(int(end_split[0]), int(end_split[1]), int(end_split[2]))
+
+    export_queue = queue.Queue(maxsize=queue_size)
+    resample_queue = queue.Queue(maxsize=queue_size)
+    failed = []
+
+    def download_stage():
+        try:
+            with Downloader(concurrent_downloads, rate, retries) as downloader_pool:
+                for symbol in symbols:
+                    try:
+                        download_assets([(symbol, start_date)], end_date, download_path, downloader_pool)
+                        console.log(f"{symbol} downloaded")
+                    except Exception as e:
+                        console.log(f"Warning: {symbol} download failed: {e}")
+                        failed.append(symbol)
+                        continue
+                    export_queue.put(symbol)
+        finally:
+            for _ in range(export_workers):
+                export_queue.put(None)
+
+    def export_stage():
+        try:
+            while (symbol := export_queue.get()) is not None:
+                try:
+                    export([symbol], "1t", start, end=end, only_absent=only_absent, mode=mode,
+                           output_format=output_format, incremental_export=incremental_run, write_tick_cache=write_tick_cache)
+                    console.log(f"{symbol} exported")
+                except Exception as e:
+                    console.log(f"Warning: {symbol} export failed: {e}")
+                    failed.append(symbol)
+                    continue
+                resample_queue.put(symbol)
+        finally:
+            resample_queue.put(None)
+
+    stages = [threading.Thread(target=download_stage)]
+    stages += [threading.Thread(target=export_stage) for _ in range(export_workers)]
+    for stage in stages:
+        stage.start()
+
+    # main.py lives in the project root; processes are spawned since this one runs threads
+    sys.path.insert(0, str(Path(__file__).parent.parent))
+    import main
+    futures = {}
+    running_exports = export_workers
+    with concurrent.futures.ProcessPoolExecutor(max_workers=resample_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        while running_exports:
+            symbol = resample_queue.get()
+            if symbol is None:
+                running_exports -= 1
+                continue
+            futures[executor.submit(main.measured_resample_symbol, symbol, mode, output_format, main.TIMEFRAMES, False, incremental_run)] = symbol
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                metrics.REGISTRY.merge(future.result())
+                console.log(f"{futures[future]} resampled")
+            except Exception as e:
+                console.log(f"Warning: {futures[future]} resample failed: {e}")
+                failed.append(futures[future])
+
+    for stage in stages:
+        stage.join()
+    if failed:
+        console.print(f"Failed symbols: {' '.join(failed)}")
+    print("Pipeline completed")
+
 
 if __name__ == "__main__":
     app()
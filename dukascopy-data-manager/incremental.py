@@ -0,0 +1,159 @@
+"""Watermark manifests and tail rewrites for incremental export/resample.
+
+Every output (CSV file or Parquet dataset directory) can have a sidecar
+"<output>.manifest.json" recording how far it is built and where the next run
+has to restart. Outputs are sorted by date, so an incremental run only has to
+drop the rows from a cut date onward and append freshly computed ones.
+"""
+import json
+import os
+import time
+from pathlib import Path
+
+import pandas as pd
+
+import parquet_store
+
+MAX_CHANGES = 50
+LINEAR_SCAN_BYTES = 64 * 1024
+
+
+def manifest_path(output) -> Path:
+    return Path(f"{output}.manifest.json")
+
+
+def load_manifest(output):
+    path = manifest_path(output)
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(output, manifest:dict) -> None:
+    path = manifest_path(output)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def record_change(manifest:dict, cut) -> None:
+    """Remember that rows from cut onward were rewritten by this run"""
+    manifest["updated_at"] = time.time()
+    changes = manifest.setdefault("changes", [])
+    changes.append({"at": manifest["updated_at"], "from": pd.Timestamp(cut).isoformat()})
+    del changes[:-MAX_CHANGES]
+
+
+def earliest_change(manifest, since:float):
+    """Return the earliest date rewritten after the since timestamp.
+
+    Returns None when nothing changed and pd.Timestamp.min when the change
+    history does not reach back far enough to tell.
+    """
+    if manifest is None:
+        return pd.Timestamp.min
+    changes = manifest.get("changes", [])
+    if len(changes) == MAX_CHANGES and changes[0]["at"] > since:
+        return pd.Timestamp.min
+    cuts = [pd.Timestamp(change["from"]) for change in changes if change["at"] > since]
+    return min(cuts) if cuts else None
+
+
+def _line_date(line:bytes) -> pd.Timestamp:
+    return pd.Timestamp(line.split(b",", 1)[0].decode())
+
+
+def csv_offset(path, cut) -> int:
+    """Byte offset of the first row dated at or after cut in a date-sorted CSV"""
+    cut = pd.Timestamp(cut)
+    with open(path, "rb") as f:
+        f.readline()
+        lo = f.tell()
+        hi = os.fstat(f.fileno()).st_size
+        # lo and hi are always line starts (or EOF) bracketing the answer
+        while hi - lo > LINEAR_SCAN_BYTES:
+            mid = (lo + hi) // 2
+            f.seek(mid - 1)
+            f.readline()
+            pos = f.tell()
+            if pos >= hi:
+                break
+            if _line_date(f.readline()) < cut:
+                lo = f.tell()
+            else:
+                hi = pos
+        f.seek(lo)
+        while lo < hi:
+            line = f.readline()
+            if _line_date(line) >= cut:
+                break
+            lo = f.tell()
+        return lo
+
+
+def read_csv_from(path, cut) -> pd.DataFrame:
+    """Read the rows of a date-sorted CSV dated at or after cut"""
+    offset = csv_offset(path, cut)
+    with open(path, "rb") as f:
+        names = f.readline().decode().strip().split(",")
+        f.seek(offset)
+        return pd.read_csv(f, header=None, names=names)
+
+
+def _append_date_format(path, dates:pd.Series):
+    """Date format keeping appended rows in the same layout as the existing ones.
+
+    pandas drops the time (or fractional seconds) when a whole chunk is at
+    midnight (or on whole seconds), and mixed layouts no longer parse as dates.
+    """
+    with open(path, "rb") as f:
+        f.readline()
+        sample = f.readline().split(b",", 1)[0]
+    values = dates.astype("int64")
+    if b"." in sample and not (values % 1_000_000_000).any():
+        return "%Y-%m-%d %H:%M:%S.%f"
+    if b" " in sample and not (values % 86_400_000_000_000).any():
+        return "%Y-%m-%d %H:%M:%S"
+    return None
+
+
+def append_csv(df:pd.DataFrame, path) -> None:
+    """Append df (which has a date column) to a date-sorted CSV, creating it if needed"""
+    path = Path(path)
+    if not path.exists() or path.stat().st_size == 0:
+        df.to_csv(path, index=False)
+        return
+    date_format = _append_date_format(path, df["date"])
+    df.to_csv(path, mode="a", header=False, index=False, date_format=date_format)
+
+
+def replace_csv_tail(df:pd.DataFrame, path, cut) -> None:
+    """Drop rows dated at or after cut and append df (which has a date column)"""
+    path = Path(path)
+    if path.exists():
+        offset = csv_offset(path, cut)
+        with open(path, "r+b") as f:
+            f.truncate(offset)
+    append_csv(df, path)
+
+
+def replace_tail(df:pd.DataFrame, output, cut, output_format:str="csv") -> None:
+    """Replace the rows of output dated at or after cut with df"""
+    if "date" not in df.columns:
+        df = df.reset_index(names="date")
+    if output_format == "parquet":
+        parquet_store.replace_tail(df, output, cut)
+    else:
+        replace_csv_tail(df, output, cut)
+
+
+def append(df:pd.DataFrame, output, output_format:str="csv") -> None:
+    """Append df, which starts at or after the last row of output"""
+    if "date" not in df.columns:
+        df = df.reset_index(names="date")
+    if output_format == "parquet":
+        parquet_store.append_dataset(df, output)
+    else:
+        append_csv(df, output)
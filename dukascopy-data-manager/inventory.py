@@ -0,0 +1,186 @@
+"""Persistent per symbol-hour inventory of a download tree.
+
+An SQLite database (inventory.sqlite at the root of the download directory)
+records for every hour the downloader, exporter or reindex command has seen
+whether its file is present, empty (the server has no ticks for it), missing
+or failed, with the file size and, once the hour has been decoded, its tick
+count. Coverage and gap questions are answered with indexed queries instead
+of walking the directory tree.
+"""
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+PRESENT = "present"
+EMPTY = "empty"
+MISSING = "missing"
+FAILED = "failed"
+
+FILE_NAME = "inventory.sqlite"
+EPOCH = datetime(1970, 1, 1)
+HOUR = timedelta(hours=1)
+# The feed can still be filling in recent hours, so they are never marked empty
+CONFIRM_EMPTY_AFTER = timedelta(days=1)
+FLUSH_EVERY = 10_000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hours (
+    symbol TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    size INTEGER,
+    ticks INTEGER,
+    PRIMARY KEY (symbol, hour)
+) WITHOUT ROWID
+"""
+
+# A NULL size keeps the known size, and the tick count is kept while the size is unchanged
+UPSERT = """
+INSERT INTO hours (symbol, hour, status, size, ticks) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (symbol, hour) DO UPDATE SET
+    status = excluded.status,
+    size = COALESCE(excluded.size, hours.size),
+    ticks = COALESCE(excluded.ticks, CASE WHEN excluded.size IS NULL OR excluded.size = hours.size THEN hours.ticks END)
+"""
+
+# "WHERE true" keeps SQLite from reading ON CONFLICT as part of the SELECT's join
+MERGE = f"""
+INSERT INTO hours (symbol, hour, status, size, ticks)
+SELECT symbol, hour, status, size, ticks FROM other.hours WHERE true
+ON CONFLICT (symbol, hour) DO UPDATE SET
+    status = excluded.status,
+    size = excluded.size,
+    ticks = excluded.ticks
+WHERE hours.status IN ('{MISSING}', '{FAILED}') AND excluded.status IN ('{PRESENT}', '{EMPTY}')
+"""
+
+
+def hour_key(hour:datetime) -> int:
+    return (hour - EPOCH) // HOUR
+
+
+def key_hour(key:int) -> datetime:
+    return EPOCH + key * HOUR
+
+
+class Inventory:
+    """Inventory of one download directory. Use as a context manager, or call close() when done.
+
+    Updates are buffered and written in batches; they can come from any thread.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(SCHEMA)
+        self.lock = threading.Lock()
+        self.pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        self.flush()
+        self.conn.close()
+
+    def record(self, symbol:str, hour:datetime, status:str, size:int=None, ticks:int=None) -> None:
+        with self.lock:
+            self.pending.append((symbol, hour_key(hour), status, size, ticks))
+            if len(self.pending) >= FLUSH_EVERY:
+                self._flush()
+
+    def mark_empty(self, symbol:str, hour:datetime) -> None:
+        """Record an hour the server returned no data for, once it is old enough to be final"""
+        if hour > datetime.now(timezone.utc).replace(tzinfo=None) - CONFIRM_EMPTY_AFTER:
+            return
+        self.record(symbol, hour, EMPTY, 0, 0)
+
+    def flush(self) -> None:
+        with self.lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self.pending:
+            return
+        with self.conn:
+            self.conn.executemany(UPSERT, self.pending)
+        self.pending = []
+
+    def _query(self, sql:str, params=()):
+        self.flush()
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def hours(self, symbol:str, start:datetime, end:datetime) -> dict:
+        """Return {hour key: (status, size)} for the recorded hours of symbol from start to end (inclusive)"""
+        rows = self._query("SELECT hour, status, size FROM hours WHERE symbol = ? AND hour BETWEEN ? AND ?",
+                           (symbol, hour_key(start), hour_key(end)))
+        return {hour: (status, size) for hour, status, size in rows}
+
+    def symbols(self) -> list:
+        return [row[0] for row in self._query("SELECT DISTINCT symbol FROM hours ORDER BY symbol")]
+
+    def last_hour(self, symbol:str):
+        """Return the latest hour of symbol that is downloaded (present or empty), or None"""
+        (key,), = self._query("SELECT MAX(hour) FROM hours WHERE symbol = ? AND status IN (?, ?)",
+                              (symbol, PRESENT, EMPTY))
+        return None if key is None else key_hour(key)
+
+    def gaps(self, symbol:str, start:datetime=None, end:datetime=None) -> list:
+        """Return the missing or failed hours of symbol, optionally limited to [start, end]"""
+        start_key = hour_key(start) if start is not None else -1
+        end_key = hour_key(end) if end is not None else 2 ** 62
+        rows = self._query("SELECT hour FROM hours WHERE symbol = ? AND hour BETWEEN ? AND ? AND status IN (?, ?) ORDER BY hour",
+                           (symbol, start_key, end_key, MISSING, FAILED))
+        return [key_hour(row[0]) for row in rows]
+
+    def coverage(self) -> list:
+        """Return one dict per symbol with its first/last present hour, counts per status, bytes and ticks"""
+        rows = self._query(f"""
+            SELECT symbol,
+                   MIN(CASE WHEN status = '{PRESENT}' THEN hour END),
+                   MAX(CASE WHEN status = '{PRESENT}' THEN hour END),
+                   SUM(status = '{PRESENT}'), SUM(status = '{EMPTY}'),
+                   SUM(status = '{MISSING}'), SUM(status = '{FAILED}'),
+                   SUM(size), SUM(ticks)
+            FROM hours GROUP BY symbol ORDER BY symbol
+        """)
+        coverage = []
+        for symbol, first, last, present, empty, missing, failed, size, ticks in rows:
+            coverage.append({
+                "symbol": symbol,
+                "first": None if first is None else key_hour(first),
+                "last": None if last is None else key_hour(last),
+                PRESENT: present, EMPTY: empty, MISSING: missing, FAILED: failed,
+                "bytes": size or 0,
+                "ticks": ticks or 0,
+            })
+        return coverage
+
+    def clear(self, symbol:str) -> None:
+        """Forget every hour of symbol except the empty ones, which have no file to reindex them from"""
+        with self.lock:
+            self._flush()
+            with self.conn:
+                self.conn.execute("DELETE FROM hours WHERE symbol = ? AND status != ?", (symbol, EMPTY))
+
+    def merge(self, path) -> None:
+        """Add the hours recorded in another inventory file; missing or failed hours take its present or empty ones"""
+        with self.lock:
+            self._flush()
+            self.conn.execute("ATTACH DATABASE ? AS other", (str(path),))
+            try:
+                with self.conn:
+                    self.conn.execute(MERGE)
+            finally:
+                self.conn.execute("DETACH DATABASE other")
+
+
+def for_download_path(download_path) -> Inventory:
+    return Inventory(Path(download_path) / FILE_NAME)
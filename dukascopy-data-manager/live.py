@@ -0,0 +1,291 @@
+"""Live bars from the hour file still being written.
+
+LiveTail polls the current hour's .bi5 of each symbol with conditional
+requests. The file is one LZMA stream, so a changed file is decompressed
+whole, but only the records after the ones already seen are converted and
+aggregated. Each timeframe's newest bar is updated in place (high/low/close,
+volumes and tick count) and completed bars are kept in a fixed-size
+BarRing per symbol and timeframe. Dukascopy can publish an hour's file late,
+so once an hour ends its file keeps being polled next to the new hour's
+until it is served unchanged or a grace period runs out; its late ticks are
+folded into the older bars. Every updated bar is passed to the subscribers,
+eg. a SocketPublisher streaming JSON lines to local clients.
+"""
+import json
+import lzma
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+import bars
+import bi5
+import downloader
+import metrics
+
+HOUR = timedelta(hours=1)
+ORIGIN = pd.Timestamp(0)
+# Export bar columns; prices are bid (open..close) and ask (ao..ac)
+BAR_DTYPE = np.dtype([(name, np.int64 if name in ("date", "tv") else np.float64) for name in bars.COLUMNS])
+
+
+def hour_url(symbol:str, hour:datetime) -> str:
+    return f"{downloader.BASE_URL}{symbol}/{hour.year}/{hour.month-1:0>2}/{hour.day:0>2}/{hour.hour:0>2}h_ticks.bi5"
+
+
+class BarRing:
+    """The last capacity bars of one symbol and timeframe, oldest overwritten first"""
+
+    def __init__(self, capacity:int):
+        self.data = np.zeros(capacity, BAR_DTYPE)
+        self.count = 0
+
+    def __len__(self):
+        return min(self.count, len(self.data))
+
+    def _slot(self, i:int) -> int:
+        return i % len(self.data)
+
+    def last(self):
+        """The newest (possibly still open) bar as a record, or None"""
+        return self.data[self._slot(self.count - 1)] if self.count else None
+
+    def merge(self, new:pd.DataFrame) -> list:
+        """Fold bars built from new ticks into the ring; returns copies of the bars that changed"""
+        changed = []
+        for row in new.itertuples(index=False):
+            date = row.date.value
+            last = self.last()
+            record = tuple(date if name == "date" else getattr(row, name) for name in bars.COLUMNS)
+            if last is None or date > last["date"]:
+                self.data[self._slot(self.count)] = record
+                self.count += 1
+            elif (slot := self._find(date)) is not None:
+                bar = self.data[slot]
+                bar["high"] = max(bar["high"], row.high)
+                bar["low"] = min(bar["low"], row.low)
+                bar["close"] = row.close
+                bar["vol"] += row.vol
+                bar["ah"] = max(bar["ah"], row.ah)
+                bar["al"] = min(bar["al"], row.al)
+                bar["ac"] = row.ac
+                bar["av"] += row.av
+                bar["tv"] += row.tv
+            elif not self._insert(record):
+                continue
+            changed.append(date)
+        # Inserting a bar moves the others, so they are looked up once every row is folded in
+        slots = [self._find(date) for date in dict.fromkeys(changed)]
+        return [self.data[slot].copy() for slot in slots if slot is not None]
+
+    def _find(self, date:int):
+        """Slot of the bar dated date, or None"""
+        lo, hi = self.count - len(self), self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.data[self._slot(mid)]["date"] < date:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count and self.data[self._slot(lo)]["date"] == date:
+            return self._slot(lo)
+        return None
+
+    def _insert(self, record:tuple) -> bool:
+        """Insert a bar older than the newest one (eg. from a late hour file); False if it is older than the ring keeps"""
+        ordered = self.data[[self._slot(i) for i in range(self.count - len(self), self.count)]]
+        position = np.searchsorted(ordered["date"], record[0])
+        if position == 0 and len(ordered) == len(self.data):
+            return False
+        ordered = np.insert(ordered, position, np.array([record], BAR_DTYPE))[-len(self.data):]
+        # The ring restarts from slot 0, oldest first
+        self.data[:len(ordered)] = ordered
+        self.count = len(ordered)
+        return True
+
+    def frame(self) -> pd.DataFrame:
+        """The bars in the ring, oldest first, indexed by date"""
+        if self.count <= len(self.data):
+            data = self.data[:self.count]
+        else:
+            data = np.roll(self.data, -self._slot(self.count))
+        df = pd.DataFrame(data)
+        df["date"] = pd.to_datetime(df["date"], unit="ns")
+        return df.set_index("date")
+
+
+class HourFile:
+    """Poll state of one hour file: the records already aggregated and the ETag of their version"""
+
+    def __init__(self, hour:datetime):
+        self.hour = hour
+        self.seen = 0
+        self.etag = None
+        # Monotonic time after which an ended hour stops being polled (None while it is the current hour)
+        self.deadline = None
+
+
+class LiveSymbol:
+    """Tail state of one symbol: the hour files being polled, oldest first, and its bars per timeframe"""
+
+    def __init__(self, symbol:str, timeframes, capacity:int, hour:datetime):
+        self.symbol = symbol
+        self.steps = {timeframe: bars.parse(timeframe)[1] for timeframe in timeframes}
+        self.rings = {timeframe: BarRing(capacity) for timeframe in timeframes}
+        self.files = [HourFile(hour)]
+
+    def add_file(self, hour_file:HourFile, content:bytes) -> list:
+        """Aggregate the ticks of a new version of an hour file that were not seen yet.
+
+        Returns (timeframe, bar record) for every bar that changed.
+        """
+        records = np.frombuffer(lzma.decompress(content), bi5.TICK_DTYPE) if content else bi5.EMPTY_RECORDS
+        if len(records) < hour_file.seen:
+            # The file was replaced by a shorter one, start the hour over
+            hour_file.seen = 0
+        new = records[hour_file.seen:]
+        hour_file.seen = len(records)
+        if not len(new):
+            return []
+        metrics.count("ticks_decoded", len(new), self.symbol)
+        columns = bi5.concat_records([new], bi5.hour_ms([hour_file.hour]))
+        ticks = {
+            "time": columns["TIME"] * 1_000_000,
+            "bid": columns["BIDP"] / 100_000,
+            "ask": columns["ASKP"] / 100_000,
+            "bidv": columns["BIDV"],
+            "askv": columns["ASKV"],
+        }
+        updates = []
+        for timeframe, step in self.steps.items():
+            starts, labels, _ = bars.bar_starts(ticks, bars.TIME, step, ORIGIN)
+            for bar in self.rings[timeframe].merge(bars.reduce(ticks, starts, labels, len(new))):
+                updates.append((timeframe, bar))
+        lag = time.time() - columns["TIME"][-1] / 1000
+        metrics.observe("tick_lag_seconds", lag, self.symbol)
+        return updates
+
+
+def bar_message(symbol:str, timeframe:str, bar) -> dict:
+    message = {"symbol": symbol, "timeframe": timeframe}
+    for name in bars.COLUMNS:
+        message[name] = pd.Timestamp(int(bar[name])).isoformat() if name == "date" else bar[name].item()
+    return message
+
+
+class LiveTail:
+    """Keeps the recent bars of symbols up to date from the hour files being written.
+
+    subscribe() callbacks receive one bar_message() dict per updated bar. A
+    bar is final once a bar with a later date was published for the same
+    symbol and timeframe and its hour's file is no longer polled: an ended
+    hour is polled until it is served unchanged, or for grace seconds.
+    """
+
+    def __init__(self, symbols, timeframes, downloader_pool:downloader.Downloader, capacity:int=1000,
+                 grace:float=600):
+        for timeframe in timeframes:
+            if bars.parse(timeframe)[0] != bars.TIME:
+                raise ValueError(f"tail only builds time bars, got {timeframe}")
+        hour = self.current_hour()
+        self.symbols = {symbol: LiveSymbol(symbol, timeframes, capacity, hour) for symbol in symbols}
+        self.pool = downloader_pool
+        self.grace = grace
+        self.subscribers = []
+
+    @staticmethod
+    def current_hour() -> datetime:
+        return datetime.now(timezone.utc).replace(tzinfo=None, minute=0, second=0, microsecond=0)
+
+    def subscribe(self, callback) -> None:
+        self.subscribers.append(callback)
+
+    def bars(self, symbol:str, timeframe:str) -> pd.DataFrame:
+        return self.symbols[symbol].rings[timeframe].frame()
+
+    def _poll(self, state:LiveSymbol) -> list:
+        updates = []
+        current = self.current_hour()
+        now = time.monotonic()
+        while state.files[-1].hour < current:
+            state.files[-1].deadline = now + self.grace
+            state.files.append(HourFile(state.files[-1].hour + HOUR))
+        for hour_file in list(state.files):
+            status, content, etag = self.pool.poll(hour_url(state.symbol, hour_file.hour), hour_file.etag, state.symbol)
+            seen = hour_file.seen
+            if content is not None:
+                hour_file.etag = etag
+                updates.extend(state.add_file(hour_file, content))
+            if hour_file.deadline is None:
+                continue
+            # An ended hour is done once its file is served unchanged (a late one is still 404 or growing)
+            unchanged = status == 304 or (status == 200 and hour_file.seen == seen)
+            if unchanged or now >= hour_file.deadline:
+                state.files.remove(hour_file)
+        return updates
+
+    def poll_once(self) -> int:
+        """Poll every symbol once and publish the bars that changed; returns their number"""
+        futures = {symbol: self.pool.executor.submit(self._poll, state) for symbol, state in self.symbols.items()}
+        published = 0
+        for symbol, future in futures.items():
+            try:
+                updates = future.result()
+            except Exception as e:
+                print(f"Warning: polling {symbol} failed: {e}")
+                continue
+            for timeframe, bar in updates:
+                message = bar_message(symbol, timeframe, bar)
+                for callback in self.subscribers:
+                    callback(message)
+                published += 1
+        return published
+
+    def run(self, interval:float=1.0, duration:float=0) -> None:
+        """Poll every interval seconds, for duration seconds (0 for ever)"""
+        stop = time.monotonic() + duration if duration else None
+        while stop is None or time.monotonic() < stop:
+            started = time.monotonic()
+            with metrics.stage("poll"):
+                self.poll_once()
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+class SocketPublisher:
+    """Subscriber sending each message as a JSON line to every client of a local TCP port"""
+
+    def __init__(self, port:int, host:str="127.0.0.1"):
+        self.server = socket.create_server((host, port))
+        self.address = self.server.getsockname()
+        self.clients = []
+        self.lock = threading.Lock()
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                client, _ = self.server.accept()
+            except OSError:
+                return
+            with self.lock:
+                self.clients.append(client)
+
+    def __call__(self, message:dict) -> None:
+        line = (json.dumps(message) + "\n").encode()
+        with self.lock:
+            for client in list(self.clients):
+                try:
+                    client.sendall(line)
+                except OSError:
+                    client.close()
+                    self.clients.remove(client)
+
+    def close(self) -> None:
+        self.server.close()
+        with self.lock:
+            for client in self.clients:
+                client.close()
+            self.clients = []
@@ -0,0 +1,271 @@
+"""Run metrics: per-stage wall and CPU time, counters and latency histograms by symbol.
+
+Each process collects into the module level REGISTRY. Code being measured
+wraps its steps in `with metrics.stage("decode", symbol):` and reports
+quantities with count() and observe(); worker processes send snapshot() back
+to be merge()d. At the end of a run, write_run_report() writes a JSON report
+and a Prometheus textfile (for node exporter's textfile collector) when
+DUKASCOPY_METRICS_DIR is set.
+
+Stage CPU time is the CPU time of the whole process while the stage ran, so
+it includes the worker threads a stage fans out to (eg. LZMA decoding), and
+stages running at the same time in different threads see each other's CPU.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PREFIX = "dukascopy"
+# Upper bounds (seconds) of the histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Counters reported by the tool, with their help text
+COUNTERS = {
+    "retries": "HTTP requests retried after a 5xx, 429, timeout or dropped connection",
+    "bytes_downloaded": "Bytes of .bi5 files downloaded",
+    "files_downloaded": "Hour files downloaded (empty hours excluded)",
+    "files_decoded": "Hour files decompressed",
+    "ticks_decoded": "Ticks decoded from hour files",
+    "output_bytes": "Bytes of export and resampled files written (what incremental runs added to them)",
+}
+
+# Histograms reported by the tool, with their help text
+HISTOGRAMS = {
+    "request_seconds": "Request latency in seconds",
+    "tick_lag_seconds": "Seconds between the last tick of a polled hour file and its arrival",
+}
+
+
+def peak_rss() -> dict:
+    """Peak resident set size in bytes of this process and of its finished child processes"""
+    if resource is None:
+        return {"self": None, "children": None}
+    # ru_maxrss is in kilobytes on Linux
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024,
+    }
+
+
+def output_size(path) -> int:
+    """Size of a file, or of every file under a directory (eg. a Parquet dataset)"""
+    path = Path(path)
+    if path.is_file():
+        return path.stat().st_size
+    if not path.is_dir():
+        return 0
+    return sum(file.stat().st_size for file in path.rglob("*") if file.is_file())
+
+
+class Metrics:
+    """Thread-safe collection of the metrics of one run"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.started = time.time()
+            # (stage, symbol): [calls, wall seconds, cpu seconds]
+            self.stages = {}
+            # (name, symbol): value
+            self.counters = {}
+            # (name, symbol): [bucket counts..., +Inf count, sum]
+            self.histograms = {}
+
+    @contextmanager
+    def stage(self, name:str, symbol:str=""):
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            self.add_stage(name, symbol, time.perf_counter() - wall, time.process_time() - cpu)
+
+    def add_stage(self, name:str, symbol:str, wall:float, cpu:float, calls:int=1) -> None:
+        with self.lock:
+            totals = self.stages.setdefault((name, symbol), [0, 0.0, 0.0])
+            totals[0] += calls
+            totals[1] += wall
+            totals[2] += cpu
+
+    def count(self, name:str, value=1, symbol:str="") -> None:
+        with self.lock:
+            self.counters[(name, symbol)] = self.counters.get((name, symbol), 0) + value
+
+    def observe(self, name:str, value:float, symbol:str="") -> None:
+        """Add value to the histogram name (bucketed by LATENCY_BUCKETS)"""
+        with self.lock:
+            histogram = self.histograms.setdefault((name, symbol), [0] * (len(LATENCY_BUCKETS) + 2))
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    histogram[i] += 1
+                    break
+            else:
+                histogram[len(LATENCY_BUCKETS)] += 1
+            histogram[-1] += value
+
+    def snapshot(self) -> dict:
+        """Picklable copy of the collected values, to merge() into another process' registry"""
+        with self.lock:
+            return {
+                "stages": {key: list(value) for key, value in self.stages.items()},
+                "counters": dict(self.counters),
+                "histograms": {key: list(value) for key, value in self.histograms.items()},
+            }
+
+    def merge(self, snapshot:dict) -> None:
+        for (name, symbol), (calls, wall, cpu) in snapshot["stages"].items():
+            self.add_stage(name, symbol, wall, cpu, calls)
+        for (name, symbol), value in snapshot["counters"].items():
+            self.count(name, value, symbol)
+        with self.lock:
+            for key, values in snapshot["histograms"].items():
+                histogram = self.histograms.setdefault(key, [0] * (len(LATENCY_BUCKETS) + 2))
+                for i, value in enumerate(values):
+                    histogram[i] += value
+
+    def report(self, command:str="") -> dict:
+        """Return the run report: totals, then stages, counters, rates and histograms per symbol"""
+        snapshot = self.snapshot()
+        symbols = {}
+
+        def entry(symbol):
+            return symbols.setdefault(symbol or "all", {"stages": {}, "counters": {}, "rates": {}, "histograms": {}})
+
+        for (name, symbol), (calls, wall, cpu) in sorted(snapshot["stages"].items()):
+            entry(symbol)["stages"][name] = {"calls": calls, "wall_seconds": wall, "cpu_seconds": cpu}
+        for (name, symbol), value in sorted(snapshot["counters"].items()):
+            entry(symbol)["counters"][name] = value
+        for (name, symbol), values in sorted(snapshot["histograms"].items()):
+            buckets = dict(zip([str(bound) for bound in LATENCY_BUCKETS] + ["+Inf"], values[:-1]))
+            entry(symbol)["histograms"][name] = {"buckets": buckets, "count": sum(values[:-1]), "sum": values[-1]}
+
+        totals = {}
+        for (name, _), value in snapshot["counters"].items():
+            totals[name] = totals.get(name, 0) + value
+        for symbol, values in symbols.items():
+            # Stages timed over several symbols at once are divided into their summed counts
+            counters = totals if symbol == "all" else values["counters"]
+            rates = values["rates"]
+            download = values["stages"].get("download")
+            if download and download["wall_seconds"]:
+                rates["files_per_second"] = counters.get("files_downloaded", 0) / download["wall_seconds"]
+                rates["bytes_per_second"] = counters.get("bytes_downloaded", 0) / download["wall_seconds"]
+            decode = values["stages"].get("decode")
+            if decode and decode["wall_seconds"]:
+                rates["ticks_per_second"] = counters.get("ticks_decoded", 0) / decode["wall_seconds"]
+
+        finished = time.time()
+        return {
+            "command": command,
+            "started_at": datetime.fromtimestamp(self.started, timezone.utc).isoformat(),
+            "finished_at": datetime.fromtimestamp(finished, timezone.utc).isoformat(),
+            "wall_seconds": finished - self.started,
+            "cpu_seconds": time.process_time(),
+            "peak_rss_bytes": peak_rss(),
+            "totals": dict(sorted(totals.items())),
+            "symbols": symbols,
+        }
+
+
+def prometheus_text(report:dict) -> str:
+    """Render a run report in the Prometheus text exposition format"""
+    command = report["command"]
+    lines = []
+
+    def family(name, kind, help_text, samples):
+        if not samples:
+            return
+        lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+        for labels, value in samples:
+            label_text = ",".join(f'{key}="{_escape(label)}"' for key, label in {"command": command, **labels}.items())
+            lines.append(f"{PREFIX}_{name}{{{label_text}}} {_number(value)}")
+
+    family("run_last_finished_timestamp_seconds", "gauge", "Unix time the run finished",
+           [({}, datetime.fromisoformat(report["finished_at"]).timestamp())])
+    family("run_wall_seconds", "gauge", "Wall time of the run", [({}, report["wall_seconds"])])
+    family("run_cpu_seconds", "gauge", "CPU time of the run's main process", [({}, report["cpu_seconds"])])
+    family("run_peak_rss_bytes", "gauge", "Peak resident set size of the run",
+           [({"process": process}, value) for process, value in report["peak_rss_bytes"].items() if value is not None])
+
+    symbols = report["symbols"]
+    for field, help_text in (("calls", "Times each stage ran"), ("wall_seconds", "Wall time spent in each stage"),
+                             ("cpu_seconds", "Process CPU time while each stage ran")):
+        family(f"stage_{field}", "gauge", help_text,
+               [({"stage": name, "symbol": symbol}, values[field])
+                for symbol, entry in symbols.items() for name, values in entry["stages"].items()])
+    for name in sorted({name for entry in symbols.values() for name in entry["counters"]}):
+        family(name, "gauge", COUNTERS.get(name, name.replace("_", " ")),
+               [({"symbol": symbol}, entry["counters"][name]) for symbol, entry in symbols.items() if name in entry["counters"]])
+    for name in sorted({name for entry in symbols.values() for name in entry["rates"]}):
+        family(name, "gauge", name.replace("_", " "),
+               [({"symbol": symbol}, entry["rates"][name]) for symbol, entry in symbols.items() if name in entry["rates"]])
+
+    for name in sorted({name for entry in symbols.values() for name in entry["histograms"]}):
+        lines.append(f"# HELP {PREFIX}_{name} {HISTOGRAMS.get(name, name.replace('_', ' '))}")
+        lines.append(f"# TYPE {PREFIX}_{name} histogram")
+        for symbol, entry in symbols.items():
+            if name not in entry["histograms"]:
+                continue
+            histogram = entry["histograms"][name]
+            labels = f'command="{_escape(command)}",symbol="{_escape(symbol)}"'
+            cumulative = 0
+            for bound, value in histogram["buckets"].items():
+                cumulative += value
+                lines.append(f'{PREFIX}_{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{PREFIX}_{name}_sum{{{labels}}} {_number(histogram['sum'])}")
+            lines.append(f"{PREFIX}_{name}_count{{{labels}}} {histogram['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _write_atomic(path:Path, text:str) -> None:
+    # node exporter may read the textfile at any time, so it is swapped in whole
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+REGISTRY = Metrics()
+
+stage = REGISTRY.stage
+count = REGISTRY.count
+observe = REGISTRY.observe
+
+
+def write_run_report(command:str, directory=None):
+    """Write {command}-{time}.json and {PREFIX}_{command}.prom to directory (DUKASCOPY_METRICS_DIR by default).
+
+    Does nothing when no directory is configured. Returns the JSON report path.
+    """
+    directory = directory or os.environ.get("DUKASCOPY_METRICS_DIR")
+    if not directory:
+        return None
+    directory = Path(directory).expanduser()
+    directory.mkdir(parents=True, exist_ok=True)
+    report = REGISTRY.report(command)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    report_path = directory / f"{command}-{stamp}.json"
+    _write_atomic(report_path, json.dumps(report, indent=2))
+    _write_atomic(directory / f"{PREFIX}_{command}.prom", prometheus_text(report))
+    return report_path
@@ -0,0 +1,23 @@
+"""Recent and full modes: date ranges over one canonical store.
+
+Every hour is downloaded, exported and resampled once, into
+{DATA_DIR}/dukascopy_live/download/ and resampled/. A mode only sets where
+the pipeline starts downloading and, for readers, the first date returned:
+recent mode reads are the canonical data sliced from MODE_START_DATES["recent"].
+The per-mode trees of earlier versions (recent/ and full/) are merged into
+the store by the migrate command.
+"""
+import pandas as pd
+
+MODES = ("recent", "full")
+MODE_START_DATES = {"recent": "2019-01-01", "full": "2006-01-01"}
+# Trees of earlier versions, in the order migrate merges them (full first, as it covers more)
+LEGACY_DIRS = ("full", "recent")
+
+
+def view_start(mode:str, start=None):
+    """First date a read in mode returns: start, moved up to the start of recent mode"""
+    if mode != "recent":
+        return start
+    first = pd.Timestamp(MODE_START_DATES["recent"])
+    return first if start is None else max(pd.Timestamp(start), first)
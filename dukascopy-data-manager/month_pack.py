@@ -0,0 +1,217 @@
+"""Monthly containers of the hour files of one symbol.
+
+A pack ({asset}/{year}/{month}/ticks.bi5pack, month zero-based like the hour
+files) replaces the day directories of a closed month. It starts with a
+header and an index of one (offset, length) slot per hour of a 31 day month:
+
+- blob packs keep the original LZMA stream of each hour, at offset with
+  length bytes, so an hour is still read with one seek and one read;
+- solid packs hold the records of the whole month as one LZMA stream, which
+  compresses better; offset and length count records, and reading any hour
+  decompresses the month (kept in a small per-process cache).
+
+A length of -1 marks an hour that is not in the pack, 0 an empty hour. Hour
+files left next to a pack (eg. written by repair) take precedence over it
+and are merged in by the next pack run.
+"""
+import lzma
+import os
+import struct
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+import bi5
+
+PACK_NAME = "ticks.bi5pack"
+MAGIC = b"DKPK"
+VERSION = 1
+HEADER = struct.Struct("<4sBB2x")
+SLOTS = 31 * 24
+INDEX_DTYPE = np.dtype([("offset", "<i8"), ("length", "<i8")])
+DATA_START = HEADER.size + SLOTS * INDEX_DTYPE.itemsize
+ABSENT = -1
+SOLID_PRESET = 9 | lzma.PRESET_EXTREME
+
+
+def month_dir(asset_dir, year:int, month:int) -> Path:
+    """Directory of a month of hour files; month is 1-based"""
+    return Path(asset_dir) / str(year) / f"{month-1:0>2}"
+
+
+def is_closed(year:int, month:int) -> bool:
+    """Whether the month ended before the current UTC month, so no more hours are added to it"""
+    now = datetime.now(timezone.utc)
+    return (year, month) < (now.year, now.month)
+
+
+class PackedHour:
+    """One hour of a pack, read like an hour file by bi5.read_payload"""
+    __slots__ = ("path", "hour", "offset", "length", "solid")
+
+    def __init__(self, path:Path, hour:datetime, offset:int, length:int, solid:bool):
+        self.path = path
+        self.hour = hour
+        self.offset = offset
+        self.length = length
+        self.solid = solid
+
+    def __str__(self):
+        return f"{self.path}#{self.hour:%d %Hh}"
+
+    @property
+    def size(self) -> int:
+        """Bytes of the hour: its LZMA stream, or its records in a solid pack (0 for an empty hour)"""
+        return self.length * bi5.TICK_DTYPE.itemsize if self.solid else self.length
+
+    def blob(self) -> bytes:
+        """The hour's original LZMA stream (blob packs only)"""
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            return f.read(self.length)
+
+    def payload(self) -> bytes:
+        """The decompressed records of the hour"""
+        if self.solid:
+            month = _solid_payload(self.path, self.path.stat().st_mtime_ns)
+            size = bi5.TICK_DTYPE.itemsize
+            return month[self.offset * size:(self.offset + self.length) * size]
+        return lzma.decompress(self.blob()) if self.length else b""
+
+
+@lru_cache(maxsize=4)
+def _solid_payload(path:Path, mtime_ns:int) -> bytes:
+    # mtime_ns is part of the key so a repacked month is read again
+    with open(path, "rb") as f:
+        f.seek(DATA_START)
+        return lzma.decompress(f.read())
+
+
+def read_pack(path, year:int, month:int) -> dict:
+    """Return {hour: PackedHour} for the hours held by a pack"""
+    path = Path(path)
+    with open(path, "rb") as f:
+        magic, version, solid = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} pack")
+        index = np.frombuffer(f.read(SLOTS * INDEX_DTYPE.itemsize), INDEX_DTYPE)
+    first = datetime(year, month, 1)
+    return {first + timedelta(hours=slot): PackedHour(path, first + timedelta(hours=slot), int(offset), int(length), bool(solid))
+            for slot, (offset, length) in enumerate(index.tolist()) if length != ABSENT}
+
+
+def write_pack(path, year:int, month:int, hours:dict, solid:bool=False) -> int:
+    """Write a pack of {hour: hour file Path or PackedHour}; returns its size in bytes"""
+    path = Path(path)
+    first = datetime(year, month, 1)
+    index = np.full(SLOTS, ABSENT, INDEX_DTYPE)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, solid))
+        f.write(index.tobytes())
+        if solid:
+            records = 0
+            compressor = lzma.LZMACompressor(preset=SOLID_PRESET)
+            for hour, source in sorted(hours.items()):
+                payload = bi5.read_payload(source)
+                count = len(payload) // bi5.TICK_DTYPE.itemsize
+                index[_slot(hour, first)] = (records, count)
+                records += count
+                f.write(compressor.compress(payload))
+            f.write(compressor.flush())
+        else:
+            offset = DATA_START
+            for hour, source in sorted(hours.items()):
+                blob = hour_blob(source)
+                index[_slot(hour, first)] = (offset, len(blob))
+                f.write(blob)
+                offset += len(blob)
+        f.seek(HEADER.size)
+        f.write(index.tobytes())
+    os.replace(tmp_path, path)
+    return path.stat().st_size
+
+
+def hour_blob(source) -> bytes:
+    """The LZMA stream of an hour, as Dukascopy serves it"""
+    if not isinstance(source, PackedHour):
+        return Path(source).read_bytes()
+    if not source.solid:
+        return source.blob()
+    payload = source.payload()
+    return lzma.compress(payload, format=lzma.FORMAT_ALONE) if payload else b""
+
+
+def _slot(hour:datetime, first:datetime) -> int:
+    return (hour - first) // timedelta(hours=1)
+
+
+class PackedAsset:
+    """Lazily opened packs of one asset, to look up hours that are no longer loose files"""
+
+    def __init__(self, asset_dir):
+        self.asset_dir = Path(asset_dir)
+        # (year, month): ({hour: PackedHour}, names of the hour files next to the pack)
+        self.months = {}
+
+    def _month(self, year:int, month:int):
+        key = (year, month)
+        if key not in self.months:
+            directory = month_dir(self.asset_dir, year, month)
+            path = directory / PACK_NAME
+            if path.is_file():
+                loose = {Path(day.name) / entry.name for day in os.scandir(directory) if day.is_dir()
+                         for entry in os.scandir(day.path)}
+                self.months[key] = (read_pack(path, year, month), loose)
+            else:
+                self.months[key] = ({}, set())
+        return self.months[key]
+
+    def lookup(self, hour:datetime):
+        """The PackedHour of hour, or None if it is not packed or a loose hour file overrides it"""
+        packed, loose = self._month(hour.year, hour.month)
+        if hour not in packed or Path(f"{hour.day:0>2}") / f"{hour.hour:0>2}h_ticks.bi5" in loose:
+            return None
+        return packed[hour]
+
+
+def pack_month(asset_dir, year:int, month:int, solid:bool=False):
+    """Pack the hour files of a month, merging them into an existing pack.
+
+    Hour files that do not pass bi5.check_file are left in place for verify
+    and repair. Returns (hours packed, broken hour files, bytes before, bytes after).
+    """
+    directory = month_dir(asset_dir, year, month)
+    path = directory / PACK_NAME
+    hours = read_pack(path, year, month) if path.is_file() else {}
+    before = path.stat().st_size if hours else 0
+
+    loose = {}
+    broken = []
+    for day in sorted(os.scandir(directory), key=lambda entry: entry.name):
+        if not day.is_dir():
+            continue
+        for entry in os.scandir(day.path):
+            if not entry.name.endswith("h_ticks.bi5"):
+                continue
+            file = Path(entry.path)
+            before += entry.stat().st_size
+            if bi5.check_file(file) is not None:
+                broken.append(file)
+                continue
+            loose[datetime(year, month, int(day.name), int(entry.name[:2]))] = file
+    if not loose and (not hours or hours[next(iter(hours))].solid == solid):
+        return 0, broken, before, before
+
+    # Hour files override the hours already packed
+    hours.update(loose)
+    after = write_pack(path, year, month, hours, solid)
+    for file in loose.values():
+        file.unlink()
+        try:
+            file.parent.rmdir()
+        except OSError:
+            pass
+    return len(hours), broken, before, after
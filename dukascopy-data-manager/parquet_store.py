@@ -0,0 +1,185 @@
+"""Columnar, date-partitioned Parquet storage for exported ticks and bars.
+
+A dataset is a directory (eg. EURUSD_1t.parquet/) laid out as
+year=YYYY/month=MM/part-0.parquet. Appends add part-1, part-2... files to
+the month they fall in, which are compacted back into part-0 once a later
+month is appended to. The "date" column is stored as int64
+epoch milliseconds, prices and volumes as float32 and tick counts as int32.
+Reads can be limited to a date range, in which case only the matching
+partitions are opened and row groups are pruned using their statistics.
+"""
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+TIME_COLUMN = "date"
+ROW_GROUP_SIZE = 256_000
+COMPRESSION = "zstd"
+COUNT_COLUMNS = {"tv"}
+
+
+def dataset_path(csv_path) -> Path:
+    """Return the dataset directory matching a CSV export path"""
+    return Path(csv_path).with_suffix(".parquet")
+
+
+def to_epoch_ms(value) -> int:
+    return int(pd.Timestamp(value).value // 1_000_000)
+
+
+def to_table(df:pd.DataFrame) -> pa.Table:
+    """Convert an export/resample frame to a typed Arrow table"""
+    columns = {}
+    for name in df.columns:
+        col = df[name]
+        if name == TIME_COLUMN:
+            values = pd.to_datetime(col).to_numpy(dtype="datetime64[ms]").astype(np.int64)
+        elif name in COUNT_COLUMNS:
+            values = col.to_numpy(dtype=np.int32)
+        elif pd.api.types.is_float_dtype(col) or pd.api.types.is_integer_dtype(col):
+            values = col.to_numpy(dtype=np.float32)
+        else:
+            values = col.to_numpy()
+        columns[name] = values
+    return pa.table(columns)
+
+
+def _partition_slices(df:pd.DataFrame):
+    """Yield (year * 100 + month, rows) for each partition df has rows in"""
+    dates = pd.to_datetime(df[TIME_COLUMN])
+    keys = dates.dt.year.to_numpy() * 100 + dates.dt.month.to_numpy()
+    # Rows arrive in time order, so each partition is a contiguous slice
+    bounds = np.flatnonzero(np.diff(keys)) + 1
+    starts = np.concatenate(([0], bounds))
+    ends = np.concatenate((bounds, [len(df)]))
+    for start, end in zip(starts, ends):
+        if start != end:
+            yield int(keys[start]), df.iloc[start:end]
+
+
+def _partition_dir(root:Path, key:int) -> Path:
+    return root / f"year={key // 100}" / f"month={key % 100:0>2}"
+
+
+def _part_files(part_dir:Path) -> list:
+    """The part files of a partition, in the order they were written"""
+    return sorted(part_dir.glob("part-*.parquet"), key=lambda file: int(file.stem.split("-")[1]))
+
+
+def _write_part(table:pa.Table, part_file:Path) -> None:
+    tmp_file = part_file.with_name(part_file.name + ".tmp")
+    pq.write_table(table, tmp_file, row_group_size=ROW_GROUP_SIZE, compression=COMPRESSION)
+    tmp_file.replace(part_file)
+
+
+def _replace_partition(part_dir:Path, table:pa.Table) -> None:
+    """Make table the only part of a partition"""
+    part_dir.mkdir(parents=True, exist_ok=True)
+    _write_part(table, part_dir / "part-0.parquet")
+    for part_file in _part_files(part_dir)[1:]:
+        part_file.unlink()
+
+
+def write_dataset(df:pd.DataFrame, root, overwrite:bool=False) -> None:
+    """Write df to root, replacing every year/month partition it touches.
+
+    With overwrite, partitions df does not touch are removed as well.
+    """
+    root = Path(root)
+    if overwrite and root.exists():
+        shutil.rmtree(root)
+    if TIME_COLUMN not in df.columns:
+        df = df.reset_index(names=TIME_COLUMN)
+    for key, rows in _partition_slices(df):
+        _replace_partition(_partition_dir(root, key), to_table(rows))
+
+
+def _range_filter(start, end):
+    expr = None
+    if start is not None:
+        start_ts = pd.Timestamp(start)
+        expr = (ds.field("year") > start_ts.year) | (
+            (ds.field("year") == start_ts.year) & (ds.field("month") >= start_ts.month))
+        expr &= ds.field(TIME_COLUMN) >= to_epoch_ms(start_ts)
+    if end is not None:
+        end_ts = pd.Timestamp(end)
+        end_expr = (ds.field("year") < end_ts.year) | (
+            (ds.field("year") == end_ts.year) & (ds.field("month") <= end_ts.month))
+        end_expr &= ds.field(TIME_COLUMN) < to_epoch_ms(end_ts)
+        expr = end_expr if expr is None else expr & end_expr
+    return expr
+
+
+def read_dataset(root, start=None, end=None, columns=None) -> pd.DataFrame:
+    """Read [start, end) from a dataset into a frame indexed by date"""
+    dataset = ds.dataset(str(root), format="parquet", partitioning="hive")
+    if columns is not None and TIME_COLUMN not in columns:
+        columns = [TIME_COLUMN, *columns]
+    if columns is None:
+        columns = [name for name in dataset.schema.names if name not in ("year", "month")]
+    table = dataset.to_table(columns=columns, filter=_range_filter(start, end))
+    df = table.to_pandas()
+    df[TIME_COLUMN] = pd.to_datetime(df[TIME_COLUMN].to_numpy(), unit="ms")
+    df = df.set_index(TIME_COLUMN)
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index()
+    return df
+
+
+def _partitions(root):
+    """Yield (year * 100 + month, directory) for each partition of a dataset"""
+    for part_dir in Path(root).glob("year=*/month=*"):
+        year = int(part_dir.parent.name.split("=")[1])
+        month = int(part_dir.name.split("=")[1])
+        yield year * 100 + month, part_dir
+
+
+def replace_tail(df:pd.DataFrame, root, cut) -> None:
+    """Drop rows dated at or after cut and append df (which has a date column)"""
+    cut = pd.Timestamp(cut)
+    cut_key = cut.year * 100 + cut.month
+    head = pd.DataFrame()
+    if Path(root).exists():
+        head = read_dataset(root, cut.replace(day=1, hour=0, minute=0, second=0, microsecond=0), cut)
+        head = head.reset_index(names=TIME_COLUMN)
+        for key, part_dir in list(_partitions(root)):
+            if key >= cut_key:
+                shutil.rmtree(part_dir)
+    combined = pd.concat([head, df], ignore_index=True) if len(head) else df
+    if len(combined):
+        write_dataset(combined, root)
+
+
+def append_dataset(df:pd.DataFrame, root) -> None:
+    """Append df (which has a date column) after the last row of a dataset.
+
+    Each partition df has rows in gets them as a new part file, so an append
+    only writes its own rows. Partitions before the last one df touches
+    can't be appended to any more and are compacted into a single part.
+    """
+    if not len(df):
+        return
+    root = Path(root)
+    last_key = None
+    for key, rows in _partition_slices(df):
+        part_dir = _partition_dir(root, key)
+        part_dir.mkdir(parents=True, exist_ok=True)
+        parts = _part_files(part_dir)
+        number = int(parts[-1].stem.split("-")[1]) + 1 if parts else 0
+        _write_part(to_table(rows), part_dir / f"part-{number}.parquet")
+        last_key = key
+    for key, part_dir in _partitions(root):
+        if key < last_key:
+            compact_partition(part_dir)
+
+
+def compact_partition(part_dir) -> None:
+    """Merge the part files of a partition into part-0, once nothing is appended to it any more"""
+    parts = _part_files(Path(part_dir))
+    if len(parts) > 1:
+        _replace_partition(Path(part_dir), pa.concat_tables([pq.ParquetFile(part_file).read() for part_file in parts]))
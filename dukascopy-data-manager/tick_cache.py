@@ -0,0 +1,157 @@
+"""Memory-mapped per-symbol cache of decoded ticks.
+
+A cache is a directory (eg. EURUSD/EURUSD_ticks/) with one raw little-endian
+file per column, all in time order: time.bin (int64 epoch milliseconds),
+ask.bin/bid.bin (int32 points) and askv.bin/bidv.bin (float32), plus a
+meta.json holding the tick count. Readers map the columns with np.memmap and
+find a time window with searchsorted on the time column, so a slice is a
+view: nothing is parsed and only the touched pages are read, and processes
+reading the same cache share the page cache.
+"""
+import json
+import os
+import shutil
+from datetime import timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = {"time": "<i8", "ask": "<i4", "bid": "<i4", "askv": "<f4", "bidv": "<f4"}
+# bi5.decode_files column each cache column is written from
+SOURCE = {"time": "TIME", "ask": "ASKP", "bid": "BIDP", "askv": "ASKV", "bidv": "BIDV"}
+POINT = 100_000
+
+
+def cache_path(export_path:str, asset:str) -> Path:
+    return Path(f"{export_path}{asset}/{asset}_ticks")
+
+
+def load_meta(root):
+    path = Path(root) / "meta.json"
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_meta(root, meta:dict) -> None:
+    path = Path(root) / "meta.json"
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def to_epoch_ms(value) -> int:
+    return int(pd.Timestamp(value).value // 1_000_000)
+
+
+def can_resume(root, start:str, cut) -> bool:
+    """Whether a cache built from start covers every hour before cut, so it can be cut and appended to"""
+    meta = load_meta(root)
+    if meta is None or meta["start"] != start or meta["last_hour"] is None:
+        return False
+    return pd.Timestamp(cut) <= pd.Timestamp(meta["last_hour"]) + timedelta(hours=1)
+
+
+class TickCacheWriter:
+    """Appends decoded tick columns to a cache.
+
+    Without cut the cache is rebuilt in a sibling directory that replaces it
+    on close(). With cut, the ticks from cut onward are dropped and new ones
+    are appended in place; meta.json always holds a count the column files
+    are at least as long as.
+    """
+
+    def __init__(self, root, start:str, cut=None):
+        self.root = Path(root)
+        self.start = start
+        self.rebuild = cut is None
+        if self.rebuild:
+            self.dir = self.root.with_name(self.root.name + ".tmp")
+            if self.dir.exists():
+                shutil.rmtree(self.dir)
+            self.dir.mkdir(parents=True)
+            self.count = 0
+        else:
+            self.dir = self.root
+            meta = load_meta(self.root)
+            times = TickCache(self.root).columns["time"]
+            self.count = int(np.searchsorted(times, to_epoch_ms(cut)))
+            del times
+            _save_meta(self.root, {**meta, "count": self.count, "last_hour": None})
+            for name, dtype in COLUMNS.items():
+                os.truncate(self.dir / f"{name}.bin", self.count * np.dtype(dtype).itemsize)
+        self.files = {name: open(self.dir / f"{name}.bin", "ab") for name in COLUMNS}
+
+    def append(self, columns:dict) -> None:
+        """Append the columns returned by bi5.decode_files"""
+        for name, dtype in COLUMNS.items():
+            np.asarray(columns[SOURCE[name]], dtype=dtype).tofile(self.files[name])
+        self.count += len(columns["TIME"])
+
+    def close(self, last_hour) -> None:
+        """Commit the cache, recording the last hour it covers"""
+        for f in self.files.values():
+            f.close()
+        _save_meta(self.dir, {
+            "start": self.start,
+            "count": self.count,
+            "last_hour": None if last_hour is None else pd.Timestamp(last_hour).isoformat(),
+            "columns": COLUMNS,
+            "point": POINT,
+        })
+        if self.rebuild:
+            if self.root.exists():
+                shutil.rmtree(self.root)
+            os.replace(self.dir, self.root)
+
+    def abort(self) -> None:
+        for f in self.files.values():
+            f.close()
+        if self.rebuild:
+            shutil.rmtree(self.dir)
+
+
+class TickCache:
+    """Read-only view of a tick cache"""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        meta = load_meta(self.root)
+        if meta is None:
+            raise FileNotFoundError(f"No tick cache at {self.root}")
+        self.count = meta["count"]
+        self.columns = {}
+        for name, dtype in COLUMNS.items():
+            if self.count:
+                self.columns[name] = np.memmap(self.root / f"{name}.bin", dtype=dtype, mode="r", shape=(self.count,))
+            else:
+                self.columns[name] = np.empty(0, dtype=dtype)
+
+    def __len__(self):
+        return self.count
+
+    def window(self, start=None, end=None):
+        """Return the (begin, stop) positions of the ticks in [start, end)"""
+        times = self.columns["time"]
+        begin = 0 if start is None else int(np.searchsorted(times, to_epoch_ms(start)))
+        stop = self.count if end is None else int(np.searchsorted(times, to_epoch_ms(end)))
+        return begin, stop
+
+    def slice(self, start=None, end=None) -> dict:
+        """Return zero-copy views of every column for the ticks in [start, end)"""
+        begin, stop = self.window(start, end)
+        return {name: column[begin:stop] for name, column in self.columns.items()}
+
+    def frame(self, start=None, end=None) -> pd.DataFrame:
+        """Return the ticks in [start, end) like a 1t export: bid, ask and volumes indexed by date"""
+        ticks = self.slice(start, end)
+        index = pd.DatetimeIndex(ticks["time"].astype("datetime64[ms]").astype("datetime64[ns]"), name="date")
+        return pd.DataFrame({
+            "bid": ticks["bid"] / POINT,
+            "ask": ticks["ask"] / POINT,
+            "bid_volume": np.asarray(ticks["bidv"]),
+            "ask_volume": np.asarray(ticks["askv"]),
+        }, index=index)
@@ -0,0 +1,45 @@
+"""FX trading calendar.
+
+The FX market closes on Friday evening and reopens on Sunday evening (UTC), so
+hour files in between never contain ticks. The default window below is the
+part of the weekend that is closed in both summer and winter time. Extra
+closed days can be given as MM-DD (every year) or YYYY-MM-DD entries, either
+to TradingCalendar or comma separated in DUKASCOPY_HOLIDAYS.
+"""
+import os
+from datetime import datetime, timedelta
+
+# (weekday, hour) in UTC, Monday is 0
+WEEKEND_CLOSE = (4, 22)
+WEEKEND_OPEN = (6, 21)
+
+HOUR = timedelta(hours=1)
+
+
+def _env_holidays():
+    value = os.environ.get("DUKASCOPY_HOLIDAYS", "")
+    return [day.strip() for day in value.split(",") if day.strip()]
+
+
+class TradingCalendar:
+    def __init__(self, holidays=None, weekend_close=WEEKEND_CLOSE, weekend_open=WEEKEND_OPEN):
+        self.holidays = set(_env_holidays() if holidays is None else holidays)
+        self.close_hour = weekend_close[0] * 24 + weekend_close[1]
+        self.open_hour = weekend_open[0] * 24 + weekend_open[1]
+
+    def is_open(self, hour:datetime) -> bool:
+        week_hour = hour.weekday() * 24 + hour.hour
+        if self.close_hour <= week_hour < self.open_hour:
+            return False
+        if not self.holidays:
+            return True
+        day = f"{hour.month:0>2}-{hour.day:0>2}"
+        return day not in self.holidays and f"{hour.year}-{day}" not in self.holidays
+
+    def hours(self, start:datetime, end:datetime):
+        """Yield every trading hour from start to end (inclusive)"""
+        hour = start
+        while hour <= end:
+            if self.is_open(hour):
+                yield hour
+            hour += HOUR
@@ -1,9 +1,25 @@
 import os
+import sys
+import concurrent.futures
+import hashlib
+import json
+import shutil
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
 import argparse
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).parent / "dukascopy-data-manager"))
+import bar_cache
+import bars
+import incremental
+import metrics
+import modes
+import parquet_store
+import tick_cache
+
 # Load environment variables from .env file
 def load_env():
     """Load environment variables from .env file"""
@@ -19,38 +35,33 @@ def load_env():
 load_env()
 
 def get_paths(mode: str = "recent"):
-    """Get paths based on mode (recent or full)"""
+    """Get the resampled directory. Both modes share it, recent mode reads are sliced (see modes.py)"""
     data_dir = os.environ.get('DATA_DIR')
     if not data_dir:
         raise ValueError("DATA_DIR not found in environment. Please set it in .env file")
     dukascopy_storage = f"{os.path.expanduser(data_dir)}/dukascopy_live"
-    if mode == "recent":
-        resampled_dir = f'{dukascopy_storage}/recent/resampled'
-    else:
-        resampled_dir = f'{dukascopy_storage}/full/resampled'
-    return resampled_dir
+    return f'{dukascopy_storage}/resampled'
 
-# Default to recent mode since that's where the data exists
 resampled_dir = get_paths("recent")
 
 def resolve_existing_mode(preferred_mode: str = "recent"):
-    """Return a tuple of (resolved_mode, resampled_dir) that actually exists on disk.
+    """Return a tuple of (mode, resampled_dir) after checking the shared store exists on disk.
 
-    Falls back to the alternate mode if the preferred one does not exist.
-    Raises FileNotFoundError if neither exists.
+    Raises FileNotFoundError if it does not, pointing to migrate when trees of an earlier version are found.
     """
-    preferred_dir = get_paths(preferred_mode)
-    if os.path.exists(preferred_dir):
-        return preferred_mode, preferred_dir
-
-    alternate_mode = "recent" if preferred_mode == "full" else "full"
-    alternate_dir = get_paths(alternate_mode)
-    if os.path.exists(alternate_dir):
-        print(f"Warning: Directory {preferred_dir} does not exist. Using '{alternate_mode}' mode instead.")
-        return alternate_mode, alternate_dir
+    if preferred_mode not in modes.MODES:
+        raise ValueError(f"mode must be one of {modes.MODES}, got {preferred_mode!r}")
+    store_dir = get_paths(preferred_mode)
+    if os.path.exists(store_dir):
+        return preferred_mode, store_dir
 
-    raise FileNotFoundError(
-        f"Neither {preferred_dir} nor {alternate_dir} exist. Please check your data directory.")
+    legacy_dirs = [str(Path(store_dir).parent / legacy) for legacy in modes.LEGACY_DIRS
+                   if (Path(store_dir).parent / legacy).exists()]
+    if legacy_dirs:
+        raise FileNotFoundError(
+            f"{store_dir} does not exist but {' and '.join(legacy_dirs)} do. "
+            "Run dukascopy-data-manager.py migrate to merge them into it.")
+    raise FileNotFoundError(f"{store_dir} does not exist. Please check your data directory.")
 
 
 def get_symbols(mode: str = "recent"):
@@ -58,26 +69,38 @@ def get_symbols(mode: str = "recent"):
     files = [folder for folder in os.listdir(resampled_dir) if os.path.isdir(os.path.join(resampled_dir, folder))]
     return files
 
-def get_price_df(symbol, verbose=True, mode: str = "full"):
+def get_price_df(symbol, verbose=True, mode: str = "full", start=None, end=None):
+    """Load ticks for symbol and return 1-minute mid-price OHLC bars.
+
+    start/end (inclusive/exclusive) limit the date range, and recent mode
+    starts at modes.MODE_START_DATES["recent"] at the earliest. When a Parquet
+    tick dataset exists, only the partitions and row groups in range are read.
+    """
     resolved_mode, resampled_dir = resolve_existing_mode(mode)
     if symbol is not None:
         all_symbols = get_symbols(resolved_mode)
         if symbol not in all_symbols:
             raise Exception(f"Symbol {symbol} not found in mode '{resolved_mode}'")
+    start = modes.view_start(resolved_mode, start)
 
     # Read the tick data file
-    csv_path = f"{resampled_dir}/{symbol}/{symbol}_1t.csv"
-    if not os.path.exists(csv_path):
-        # Last-resort: try alternate mode once in case the symbol exists only there
-        alternate_mode, alternate_dir = resolve_existing_mode("recent" if resolved_mode == "full" else "full")
-        alt_csv_path = f"{alternate_dir}/{symbol}/{symbol}_1t.csv"
-        if os.path.exists(alt_csv_path):
-            print(f"Warning: File not found at {csv_path}. Using {alt_csv_path} instead.")
-            csv_path = alt_csv_path
-        else:
-            raise FileNotFoundError(f"Tick CSV not found for {symbol}: {csv_path}")
-
-    price_df = pd.read_csv(csv_path)
+    path = _tick_source(resampled_dir, symbol)
+    if not path.exists():
+        raise FileNotFoundError(f"Tick CSV not found for {symbol}: {path}")
+
+    with metrics.stage("read_ticks", symbol or ""):
+        ticks = _read_ticks(path, start, end, verbose=verbose)
+    with metrics.stage("ohlc", symbol or ""):
+        return _ticks_to_ohlc(ticks, verbose)
+
+def _read_ticks(path, start=None, end=None, columns=("bid", "ask"), verbose=True):
+    """Read ticks in [start, end) from a tick CSV, Parquet dataset or tick cache into a frame indexed by date"""
+    if path.name.endswith("_ticks"):
+        return tick_cache.TickCache(path).frame(start, end)[list(columns)]
+    if path.suffix == ".parquet":
+        return parquet_store.read_dataset(path, start, end, columns=list(columns))
+
+    price_df = pd.read_csv(path) if start is None else incremental.read_csv_from(path, start)
     price_df.set_index("date", inplace=True)
     price_df.index = pd.to_datetime(price_df.index, errors='coerce')
 
@@ -85,55 +108,508 @@ def get_price_df(symbol, verbose=True, mode: str = "full"):
     if verbose and unreadable_count > 0:
         print(f"dropping {unreadable_count} ({unreadable_count/len(price_df):.5%}) unreadable indexes")
     price_df = price_df[~price_df.index.isnull()]
+    return _slice_range(price_df, start, end)[list(columns)]
+
+def _slice_range(df, start=None, end=None):
+    """Keep rows of a DatetimeIndex-ed frame in [start, end)"""
+    if start is not None:
+        df = df[df.index >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[df.index < pd.Timestamp(end)]
+    return df
+
+def _ticks_to_ohlc(price_df, verbose=True, price="mid"):
+    """Resample ticks to 1-minute OHLC bars of the mid, bid or ask price"""
     nan_count = len(price_df) - len(price_df.dropna())
     if verbose and nan_count > 0:
         print(f"dropping {nan_count} ({nan_count/len(price_df):.5%}) nan rows")
     
-    # Convert bid/ask data to OHLC format using the midpoint
+    # Convert bid/ask data to OHLC format using the midpoint (or one side)
     clean_df = price_df.dropna().sort_index()
-    clean_df['price'] = (clean_df['bid'] + clean_df['ask']) / 2
+    clean_df['price'] = (clean_df['bid'] + clean_df['ask']) / 2 if price == "mid" else clean_df[price]
     
-    # Create OHLC data for 1-minute resampling
-    ohlc_df = clean_df['price'].resample('1min').agg({
-        'open': 'first',
-        'high': 'max', 
-        'low': 'min',
-        'close': 'last'
-    }).dropna()
+    # Create OHLC data for 1-minute resampling in one pass over the sorted ticks
+    labels, open_, high, low, close = bars.ohlc(
+        clean_df.index.to_numpy(dtype="datetime64[ns]").view("int64"),
+        clean_df['price'].to_numpy(), pd.Timedelta("1min"))
+    ohlc_df = pd.DataFrame({'open': open_, 'high': high, 'low': low, 'close': close},
+                           index=pd.DatetimeIndex(labels.astype("datetime64[ns]"), name=clean_df.index.name))
     
     return ohlc_df
 
-def get_price_df_resampled(timeframe, symbol=None, verbose=True, nocache=False, mode: str = "full"):
-    resolved_mode, resampled_dir = resolve_existing_mode(mode)
+TIMEFRAMES = ["1min", "5min", "10min", "15min", "30min", "1h", "2h", "4h", "6h", "12h", "1d"]
+
+# Each timeframe is resampled from the largest finer timeframe that divides it,
+# so every bar of the source lines up with exactly one bar of the target
+CASCADE_SOURCE = {
+    "5min": "1min",
+    "10min": "5min",
+    "15min": "5min",
+    "30min": "15min",
+    "1h": "30min",
+    "2h": "1h",
+    "4h": "2h",
+    "6h": "2h",
+    "12h": "6h",
+    "1d": "12h",
+}
+
+OHLC_AGG = {
+    "open": "first",
+    "high": "max",
+    "low": "min",
+    "close": "last",
+}
+
+def _resampled_path(resampled_dir, symbol, timeframe, fmt="csv"):
     path = f"{resampled_dir}/{symbol}/{symbol}_resampled_{timeframe}.csv"
-    if os.path.exists(path) and not nocache:
-        return pd.read_csv(path).set_index("date")
+    if fmt == "parquet":
+        return parquet_store.dataset_path(path)
+    return Path(path)
+
+def _write_resampled(df, path, fmt="csv"):
+    # Ensure the directory exists before saving
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if fmt == "parquet":
+        # The dataset is built next to the old one and swapped in, so no partition of it survives the rebuild
+        tmp_path = Path(f"{path}.tmp")
+        parquet_store.write_dataset(df, tmp_path, overwrite=True)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
     else:
-        df = get_price_df(symbol, verbose, resolved_mode).resample(timeframe).agg({
-            "open": "first",
-            "high": "max",
-            "low": "min",
-            "close": "last",
-        })
-        # Ensure the directory exists before saving
-        os.makedirs(os.path.dirname(path), exist_ok=True)
         df.to_csv(path)
-        return df
+
+def get_price_df_resampled(timeframe, symbol=None, verbose=True, nocache=False, mode: str = "full",
+                           fmt: str = "csv", start=None, end=None):
+    """Return timeframe OHLC bars for symbol, using the cached file when present.
+
+    fmt selects the cache format ("csv" or "parquet"). The cache is only
+    (re)written when the full history is computed, ie. start and end are None,
+    whatever the mode; recent mode returns it from modes.MODE_START_DATES["recent"].
+    """
+    resolved_mode, resampled_dir = resolve_existing_mode(mode)
+    path = _resampled_path(resampled_dir, symbol, timeframe, fmt)
+    view_start = modes.view_start(resolved_mode, start)
+    if path.exists() and not nocache:
+        with metrics.stage("read_bars", symbol or ""):
+            if fmt == "parquet":
+                return parquet_store.read_dataset(path, view_start, end)
+            return _read_bars_csv(path, view_start, end)
+
+    ohlc_1min = get_price_df(symbol, verbose, "full", start, end)
+    with metrics.stage("resample", symbol or ""):
+        df = ohlc_1min.resample(timeframe).agg(OHLC_AGG)
+    if start is None and end is None:
+        with metrics.stage("write", symbol or ""):
+            _write_resampled(df, path, fmt)
+        metrics.count("output_bytes", metrics.output_size(path), symbol or "")
+    return _slice_range(df, view_start) if view_start is not None else df
+
+_bar_cache_client = None
+
+def get_shared_price_df_resampled(timeframe, symbol=None, verbose=True, nocache=False, mode: str = "full",
+                                  fmt: str = "csv", start=None, end=None):
+    """get_price_df_resampled served by the bar cache (dukascopy-data-manager.py bar-cache) when it runs.
+
+    The returned frame maps the bars every process shares and must not be
+    modified in place. Without a running bar cache, returns get_price_df_resampled().
+    """
+    global _bar_cache_client
+    try:
+        # A client inherited from a forked parent would share its connection
+        if _bar_cache_client is None or _bar_cache_client[0] != os.getpid():
+            _bar_cache_client = (os.getpid(), bar_cache.BarCacheClient())
+        return _bar_cache_client[1].get_price_df_resampled(timeframe, symbol, verbose, nocache, mode, fmt, start, end)
+    except ConnectionError:
+        _bar_cache_client = None
+        if verbose:
+            print("The bar cache is not running, reading the resampled file directly")
+        return get_price_df_resampled(timeframe, symbol, verbose, nocache, mode, fmt, start, end)
+
+def _read_bars_csv(path, start=None, end=None):
+    """Read the bars of a resampled CSV in [start, end) into a frame indexed by date"""
+    df = pd.read_csv(path) if start is None else incremental.read_csv_from(path, start)
+    df = df.set_index("date")
+    df.index = pd.to_datetime(df.index)
+    return _slice_range(df, start, end)
+
+def resample_cascade(ohlc_1min, timeframes=TIMEFRAMES):
+    """Build every timeframe in timeframes from 1-minute OHLC bars in one cascade"""
+    frames = {"1min": ohlc_1min.resample("1min").agg(OHLC_AGG)}
+    last = max(TIMEFRAMES.index(timeframe) for timeframe in timeframes)
+    for timeframe in TIMEFRAMES[1:last + 1]:
+        frames[timeframe] = frames[CASCADE_SOURCE[timeframe]].resample(timeframe).agg(OHLC_AGG)
+    return {timeframe: frames[timeframe] for timeframe in timeframes}
+
+def _tick_path(resampled_dir, symbol):
+    csv_path = f"{resampled_dir}/{symbol}/{symbol}_1t.csv"
+    parquet_path = parquet_store.dataset_path(csv_path)
+    return parquet_path if parquet_path.exists() else Path(csv_path)
+
+def _tick_source(resampled_dir, symbol):
+    """Tick cache if it covers the 1t export and is at least as recent, else the 1t export"""
+    export_path = _tick_path(resampled_dir, symbol)
+    cache_meta = Path(f"{resampled_dir}/{symbol}/{symbol}_ticks/meta.json")
+    if not cache_meta.exists():
+        return export_path
+    if not export_path.exists():
+        return cache_meta.parent
+    if cache_meta.stat().st_mtime >= export_path.stat().st_mtime and _cache_covers(cache_meta.parent, export_path):
+        return cache_meta.parent
+    return export_path
+
+def _cache_covers(cache_root, export_path):
+    """Whether a tick cache holds every hour of the 1t export, as recorded by their meta.json and manifest.
+
+    export --tick-cache writes the cache with any timeframe and from any start,
+    so a newer cache can still hold fewer ticks than the 1t export.
+    """
+    meta = tick_cache.load_meta(cache_root)
+    manifest = incremental.load_manifest(export_path)
+    if meta is None or meta.get("last_hour") is None or manifest is None or manifest.get("last_hour") is None:
+        return False
+    return (pd.Timestamp(meta["start"]) <= pd.Timestamp(manifest["start"])
+            and pd.Timestamp(meta["last_hour"]) >= pd.Timestamp(manifest["last_hour"]))
+
+def _resample_state_path(resampled_dir, symbol, fmt):
+    # The manifest of a symbol's resampled outputs is stored next to them
+    return Path(f"{resampled_dir}/{symbol}/{symbol}_resampled_{fmt}")
+
+def _incremental_cut(resampled_dir, symbol, fmt, timeframes):
+    """Date from which the resampled outputs have to be rebuilt, or None for a full rebuild"""
+    manifest = incremental.load_manifest(_resample_state_path(resampled_dir, symbol, fmt))
+    if manifest is None or manifest["fmt"] != fmt or not set(timeframes) <= set(manifest["timeframes"]):
+        return None
+    cut = pd.Timestamp(manifest["cut"])
+    changed = incremental.earliest_change(incremental.load_manifest(_tick_path(resampled_dir, symbol)), manifest["updated_at"])
+    if changed == pd.Timestamp.min:
+        return None
+    if changed is not None:
+        cut = min(cut, changed.floor("D"))
+    return cut
+
+def resample_symbol(symbol, mode: str = "full", fmt: str = "csv", timeframes=TIMEFRAMES, verbose=True,
+                    incremental_run=False):
+    """Load symbol's ticks once and write all timeframes to the resampled directory.
+
+    With incremental_run, only ticks from the start of the last daily bar (or of
+    the earliest day the tick export rewrote since) are loaded, and the outputs
+    are rewritten from there on. The outputs are shared by both modes, so they
+    always cover every tick.
+    """
+    resolved_mode, resampled_dir = resolve_existing_mode(mode)
+    cut = _incremental_cut(resampled_dir, symbol, fmt, timeframes) if incremental_run else None
+    ohlc_1min = get_price_df(symbol, verbose, "full", start=cut)
+    if cut is not None and (ohlc_1min.empty or ohlc_1min.index[0] > cut):
+        # Start every timeframe at the cut so empty leading bars match a full rebuild
+        leading_bar = pd.DataFrame(index=pd.DatetimeIndex([cut], name=ohlc_1min.index.name),
+                                   columns=ohlc_1min.columns, dtype=float)
+        ohlc_1min = pd.concat([leading_bar, ohlc_1min])
+    with metrics.stage("resample", symbol):
+        frames = resample_cascade(ohlc_1min, timeframes)
+    for timeframe, df in frames.items():
+        path = _resampled_path(resampled_dir, symbol, timeframe, fmt)
+        # An incremental run only counts the bytes it grew the output by
+        size_before = metrics.output_size(path) if cut is not None else 0
+        with metrics.stage("write", symbol):
+            if cut is None:
+                _write_resampled(df, path, fmt)
+            else:
+                incremental.replace_tail(df, path, cut, fmt)
+        metrics.count("output_bytes", max(0, metrics.output_size(path) - size_before), symbol)
+
+    last_bars = ohlc_1min.dropna().index
+    if len(last_bars):
+        manifest = {
+            "fmt": fmt,
+            "timeframes": list(timeframes),
+            "cut": last_bars[-1].floor("D").isoformat(),
+        }
+        incremental.record_change(manifest, cut if cut is not None else ohlc_1min.index[0])
+        incremental.save_manifest(_resample_state_path(resampled_dir, symbol, fmt), manifest)
+    return symbol
+
+def measured_resample_symbol(*args, **kwargs):
+    """resample_symbol for a worker process: returns the metrics it collected, to merge into the parent's"""
+    metrics.REGISTRY.reset()
+    resample_symbol(*args, **kwargs)
+    return metrics.REGISTRY.snapshot()
+
+def resample_symbols(symbols, mode: str = "full", fmt: str = "csv", timeframes=TIMEFRAMES, workers: int = 1,
+                     incremental_run=False):
+    """Run resample_symbol for each symbol, across a process pool when workers > 1"""
+    if workers <= 1:
+        for symbol in tqdm(symbols, desc="Resampling"):
+            resample_symbol(symbol, mode, fmt, timeframes, incremental_run=incremental_run)
+        return
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(measured_resample_symbol, symbol, mode, fmt, timeframes, False, incremental_run) for symbol in symbols]
+        for future in tqdm(concurrent.futures.as_completed(futures), total=len(futures), desc="Resampling"):
+            metrics.REGISTRY.merge(future.result())
+
+PRICES = ("mid", "bid", "ask")
+
+def _source_signature(path):
+    """mtimes identifying the version of a CSV file or Parquet dataset.
+
+    Parquet writes replace the partitions from the first changed month
+    onward, so the latest year and month directories change with any write.
+    """
+    signature = [os.stat(path).st_mtime_ns]
+    for _ in range(2):
+        if not os.path.isdir(path):
+            break
+        names = [name for name in os.listdir(path) if "=" in name]
+        if not names:
+            break
+        path = os.path.join(path, max(names))
+        signature.append(os.stat(path).st_mtime_ns)
+    return tuple(signature)
+
+PANEL_FIELDS = ("open", "high", "low", "close")
+
+def _panel_dir(resampled_dir):
+    # Kept outside the resampled directory, whose subdirectories are taken for symbols
+    return Path(resampled_dir).parent / "panels"
+
+def _align_panel(frames, field_count):
+    """Copy each frame into one (time, symbol, field) array over the union of their dates"""
+    dates = [df.index.to_numpy(dtype="datetime64[ns]") for df in frames]
+    index = np.unique(np.concatenate(dates)) if dates else np.empty(0, dtype="datetime64[ns]")
+    values = np.full((len(index), len(frames), field_count), np.nan)
+    for i, (df, frame_dates) in enumerate(zip(frames, dates)):
+        values[np.searchsorted(index, frame_dates), i, :] = df.to_numpy(dtype=np.float64)
+    return values, pd.DatetimeIndex(index, name="date")
+
+def _load_panel_file(path, versions):
+    """(values, index) of a cached panel, or None if it is missing or its sources changed"""
+    if not path.exists():
+        return None
+    with np.load(path) as data:
+        if str(data["versions"]) != versions:
+            return None
+        return data["values"], pd.DatetimeIndex(data["index"], name="date")
+
+def _save_panel_file(path, versions, values, index):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        np.savez(f, values=values, index=index.to_numpy(dtype="datetime64[ns]"), versions=np.array(versions))
+    os.replace(tmp_path, path)
+
+class DukascopyStore:
+    """Range reads of ticks and OHLC bars with an in-process LRU cache.
+
+    load() reads mid-price bars from the resampled files when they exist and
+    builds them from the ticks otherwise (always for bid/ask bars). Loaded
+    frames are cached up to cache_bytes in total and dropped when their
+    source changes; a range inside a cached one is served as a slice of it.
+    Symbol and file listings are cached until their directory mtime changes.
+    A recent mode store reads from modes.MODE_START_DATES["recent"] onward.
+    Returned frames share their data with the cache and must not be modified
+    in place.
+    """
+
+    def __init__(self, mode: str = "full", fmt: str = None, cache_bytes: int = 512 * 2**20):
+        self.mode, self.resampled_dir = resolve_existing_mode(mode)
+        # None prefers Parquet and falls back to CSV
+        self.formats = [fmt] if fmt else ["parquet", "csv"]
+        self.cache_bytes = cache_bytes
+        self.cache = OrderedDict()
+        self.cached_bytes = 0
+        self.listings = {}
+
+    def _listing(self, path):
+        """Names in a directory (empty if it does not exist), cached until its mtime changes"""
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            cached = self.listings.get(path)
+            if cached is None or cached[0] != mtime:
+                cached = (mtime, frozenset(os.listdir(path)))
+                self.listings[path] = cached
+        except (FileNotFoundError, NotADirectoryError):
+            return frozenset()
+        return cached[1]
+
+    def symbols(self):
+        names = self._listing(self.resampled_dir)
+        return sorted(name for name in names if self._listing(f"{self.resampled_dir}/{name}"))
+
+    def _source(self, symbol, timeframe, price):
+        """Return (path, is_tick_data) of the file load() reads from"""
+        symbol_dir = f"{self.resampled_dir}/{symbol}"
+        names = self._listing(symbol_dir)
+        if not names:
+            raise Exception(f"Symbol {symbol} not found in mode '{self.mode}'")
+        if timeframe != "1t" and price == "mid":
+            for fmt in self.formats:
+                path = _resampled_path(self.resampled_dir, symbol, timeframe, fmt)
+                if path.name in names:
+                    return path, False
+        if f"{symbol}_ticks" in names:
+            path = _tick_source(self.resampled_dir, symbol)
+            if path.name == f"{symbol}_ticks":
+                return path, True
+        for fmt in self.formats:
+            name = f"{symbol}_1t.{fmt}"
+            if name in names:
+                return Path(symbol_dir) / name, True
+        raise FileNotFoundError(f"No tick data for {symbol} in {symbol_dir}")
+
+    def load(self, symbol, timeframe: str = "1min", start=None, end=None, price: str = "mid"):
+        """Return symbol's timeframe bars (or "1t" ticks) in [start, end), indexed by a DatetimeIndex.
+
+        price picks the mid, bid or ask prices for bars; ticks always have
+        bid, ask, bid_volume and ask_volume columns.
+        """
+        if price not in PRICES:
+            raise ValueError(f"price must be one of {PRICES}, got {price!r}")
+        start = modes.view_start(self.mode, None if start is None else pd.Timestamp(start))
+        end = None if end is None else pd.Timestamp(end)
+        path, is_ticks = self._source(symbol, timeframe, price)
+        signature = _source_signature(path)
+        source = (symbol, timeframe, price if not is_ticks or timeframe != "1t" else None)
+
+        df = self._lookup(source, signature, start, end)
+        if df is None:
+            df = self._read(path, is_ticks, timeframe, start, end, price)
+            self._remember(source, signature, start, end, df)
+        return df.copy(deep=False)
+
+    def _read(self, path, is_ticks, timeframe, start, end, price):
+        if not is_ticks:
+            if path.suffix == ".parquet":
+                return parquet_store.read_dataset(path, start, end)
+            return _read_bars_csv(path, start, end)
+        if timeframe == "1t":
+            return _read_ticks(path, start, end, ("bid", "ask", "bid_volume", "ask_volume"), verbose=False)
+
+        # Read whole bars at both ends so they match the ones of the full history
+        step = pd.Timedelta(timeframe)
+        read_start = None if start is None else start.floor("D")
+        read_end = None if end is None else end + step
+        df = _ticks_to_ohlc(_read_ticks(path, read_start, read_end, verbose=False), False, price)
+        if timeframe != "1min":
+            df = df.resample(timeframe).agg(OHLC_AGG)
+        return _slice_range(df, start, end)
+
+    def _lookup(self, source, signature, start, end):
+        """Return the requested range from a cached frame covering it, or None"""
+        for key in list(self.cache):
+            if key[0] != source:
+                continue
+            cached_signature, df, nbytes = self.cache[key]
+            if cached_signature != signature:
+                self._forget(key)
+                continue
+            cached_start, cached_end = key[1], key[2]
+            if cached_start is not None and (start is None or start < cached_start):
+                continue
+            if cached_end is not None and (end is None or end > cached_end):
+                continue
+            self.cache.move_to_end(key)
+            begin = 0 if start is None else df.index.searchsorted(start)
+            stop = len(df) if end is None else df.index.searchsorted(end)
+            return df.iloc[begin:stop]
+        return None
+
+    def _remember(self, source, signature, start, end, df):
+        nbytes = int(df.memory_usage(index=True).sum())
+        if nbytes > self.cache_bytes:
+            return
+        key = (source, start, end)
+        if key in self.cache:
+            self._forget(key)
+        self.cache[key] = (signature, df, nbytes)
+        self.cached_bytes += nbytes
+        while self.cached_bytes > self.cache_bytes:
+            self._forget(next(iter(self.cache)))
+
+    def _forget(self, key):
+        self.cached_bytes -= self.cache.pop(key)[2]
+
+    def load_panel(self, symbols=None, timeframe: str = "1h", start=None, end=None, field="close",
+                   price: str = "mid", as_array=False, workers: int = 8, cache=True):
+        """Return timeframe bars of several symbols aligned on the union of their dates.
+
+        field is one of PANEL_FIELDS, or a list of them. The result is a frame
+        with a column per symbol (per (symbol, field) for a list of fields), or
+        with as_array a (values, index) pair where values is a dense
+        (time, symbol, field) float64 array; dates missing for a symbol are
+        NaN. Symbols are read in parallel threads and copied once into the
+        shared array. With cache, panels are kept on disk next to the
+        resampled directory, keyed by the arguments and the versions of the
+        source files.
+        """
+        if timeframe == "1t":
+            raise ValueError("load_panel aligns bars, use load() for ticks")
+        if price not in PRICES:
+            raise ValueError(f"price must be one of {PRICES}, got {price!r}")
+        fields = [field] if isinstance(field, str) else list(field)
+        unknown = [name for name in fields if name not in PANEL_FIELDS]
+        if unknown:
+            raise ValueError(f"fields must be in {PANEL_FIELDS}, got {unknown}")
+        symbols = self.symbols() if symbols is None else list(symbols)
+        start = modes.view_start(self.mode, None if start is None else pd.Timestamp(start))
+        end = None if end is None else pd.Timestamp(end)
+
+        sources = [self._source(symbol, timeframe, price) for symbol in symbols]
+        cache_path = None
+        if cache:
+            inputs = [self.mode, self.formats, symbols, timeframe, str(start), str(end), fields, price]
+            cache_path = _panel_dir(self.resampled_dir) / f"{hashlib.sha1(json.dumps(inputs).encode()).hexdigest()}.npz"
+            versions = json.dumps([[str(path), list(_source_signature(path))] for path, _ in sources])
+        panel = _load_panel_file(cache_path, versions) if cache_path is not None else None
+        if panel is None:
+            def read(source):
+                path, is_ticks = source
+                return self._read(path, is_ticks, timeframe, start, end, price)[fields]
+
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(workers, len(sources)))) as executor:
+                frames = list(executor.map(read, sources))
+            panel = _align_panel(frames, len(fields))
+            if cache_path is not None:
+                _save_panel_file(cache_path, versions, *panel)
+
+        values, index = panel
+        if as_array:
+            return values, index
+        columns = pd.Index(symbols, name="symbol") if isinstance(field, str) else \
+            pd.MultiIndex.from_product([symbols, fields], names=["symbol", "field"])
+        # (time, symbol * field) view of the panel, so the frame shares its data
+        return pd.DataFrame(values.reshape(len(index), -1), index=index, columns=columns)
+
+    def clear(self):
+        """Drop every cached frame and listing"""
+        self.cache.clear()
+        self.cached_bytes = 0
+        self.listings.clear()
+
+def load_panel(symbols=None, timeframe: str = "1h", start=None, end=None, field="close", mode: str = "full",
+               fmt: str = None, **kwargs):
+    """Aligned bars of several symbols, see DukascopyStore.load_panel"""
+    return DukascopyStore(mode, fmt).load_panel(symbols, timeframe, start, end, field, **kwargs)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Process price data for different timeframes')
     parser.add_argument('--symbol', type=str, help='Specific symbol to process. If not provided, processes all symbols.')
     parser.add_argument('--mode', type=str, choices=['recent', 'full'], default='recent', 
-                       help='Mode: recent or full - determines which directories to use')
+                       help='Mode: recent or full - both use the same store, recent reads start in 2019')
     parser.add_argument('--reverse', action='store_true', 
                        help='Reverse the order of symbols processing')
+    parser.add_argument('--format', type=str, choices=['csv', 'parquet'], default='csv',
+                       help='Output format for resampled files')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='Number of symbols to resample in parallel processes')
+    parser.add_argument('--incremental', action='store_true',
+                       help='Only rebuild the trailing bars (and any days the tick export rewrote)')
     args = parser.parse_args()
 
-    mytqdm = tqdm(["1min", "5min", "10min", "15min", "30min", "1h", "2h", "4h", "6h", "12h", "1d"])
-    for timeframe in mytqdm:
-        mytqdm.set_description(timeframe)
-        symbols = [args.symbol] if args.symbol else get_symbols(args.mode)
-        if args.reverse and not args.symbol:
-            symbols = list(reversed(symbols))
-        for symbol in symbols:
-            _ = get_price_df_resampled(timeframe, symbol, nocache=True, mode=args.mode)
\ No newline at end of file
+    symbols = [args.symbol] if args.symbol else get_symbols(args.mode)
+    if args.reverse and not args.symbol:
+        symbols = list(reversed(symbols))
+    try:
+        resample_symbols(symbols, mode=args.mode, fmt=args.format, workers=args.workers, incremental_run=args.incremental)
+    finally:
+        metrics.write_run_report("resample")
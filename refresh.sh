@@ -12,13 +12,6 @@ else
     MODE="recent"
 fi
 
-# Build mode flag for downstream scripts
-if [[ "$MODE" == "recent" ]]; then
-    MODE_FLAG="--recent"
-else
-    MODE_FLAG=""
-fi
-
 # Check for --reverse flag to determine if symbols should be reversed
 if [[ "$*" == *"--reverse"* ]]; then
     REVERSE="--reverse"
@@ -26,20 +19,28 @@ else
     REVERSE=""
 fi
 
-echo "Debug: Arguments passed to refresh.sh: $*"
-echo "Debug: Resolved MODE=$MODE (MODE_FLAG='${MODE_FLAG}')"
+# Check for --incremental flag to only rebuild what changed since the last run
+if [[ "$*" == *"--incremental"* ]]; then
+    INCREMENTAL="--incremental"
+else
+    INCREMENTAL=""
+fi
 
-# 1) Download ticks for the chosen mode
-bash "${PROJECT_DIR}/run.sh" download $MODE_FLAG $REVERSE
+echo "Debug: Arguments passed to refresh.sh: $*"
+echo "Debug: Resolved MODE=$MODE"
 
-# 2) Export 1t for the same mode (and propagate --only-absent if present)
+# Check for --only-absent flag to skip symbols that are already exported
 if [[ "$*" == *"--only-absent"* ]]; then
     echo "Debug: --only-absent flag detected in refresh.sh"
-    bash "${PROJECT_DIR}/run.sh" export 1t $MODE_FLAG --only-absent
+    ONLY_ABSENT="--only-absent"
 else
     echo "Debug: --only-absent flag NOT detected in refresh.sh"
-    bash "${PROJECT_DIR}/run.sh" export 1t $MODE_FLAG
+    ONLY_ABSENT=""
 fi
 
-# 3) Resample via Python with the same mode
-"${PROJECT_DIR}/myenv/bin/python" "${PROJECT_DIR}/main.py" --mode=$MODE
\ No newline at end of file
+# Download, export 1t and resample every symbol in one process, with the stages
+# overlapping (see `dukascopy-data-manager.py pipeline --help` for the pool sizes)
+"${PROJECT_DIR}/myenv/bin/python" "${PROJECT_DIR}/dukascopy-data-manager/dukascopy-data-manager.py" pipeline \
+    --mode=$MODE $REVERSE $ONLY_ABSENT $INCREMENTAL \
+    --concurrent="${DOWNLOAD_CONCURRENCY:-8}" --rate="${DOWNLOAD_RATE:-0}" \
+    --export-workers="${EXPORT_WORKERS:-2}" --resample-workers="${RESAMPLE_WORKERS:-2}"
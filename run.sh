@@ -18,6 +18,13 @@ else
     MODE="full"
 fi
 
+# Check for --incremental flag (export only)
+if [[ "$*" == *"--incremental"* ]]; then
+    INCREMENTAL="--incremental"
+else
+    INCREMENTAL=""
+fi
+
 # Check for --reverse flag
 if [[ "$*" == *"--reverse"* ]]; then
     REVERSE_SYMBOLS=true
@@ -27,30 +34,28 @@ fi
 
 source "${PROJECT_DIR}/myenv/bin/activate"
 
-# Process each symbol individually
-if [ "$1" == "download" ] && [ "$REVERSE_SYMBOLS" = true ]; then
-    # Reverse the symbols for download
-    tac "$SYMBOLS_FILE" | while read -r symbol; do
-        echo "Processing symbol: $symbol"
-        python "${PROJECT_DIR}/dukascopy-data-manager/dukascopy-data-manager.py" $1 "$symbol" $START_DATE --concurrent=3 --mode=$MODE
-    done
+# Download all symbols in one process so they share one connection pool,
+# concurrency limit and rate limit
+if [ "$1" == "download" ]; then
+    if [ "$REVERSE_SYMBOLS" = true ]; then
+        SYMBOLS=$(tac "$SYMBOLS_FILE")
+    else
+        SYMBOLS=$(cat "$SYMBOLS_FILE")
+    fi
+    echo "Processing symbols: $(echo $SYMBOLS)"
+    python "${PROJECT_DIR}/dukascopy-data-manager/dukascopy-data-manager.py" $1 $SYMBOLS $START_DATE --concurrent="${DOWNLOAD_CONCURRENCY:-8}" --rate="${DOWNLOAD_RATE:-0}" --mode=$MODE
 else
-    # Normal processing (original order)
+    # Process each symbol individually
     while read -r symbol; do
         echo "Processing symbol: $symbol"
-        # Check if the first argument is 'download' and include concurrent workers if true
-        if [ "$1" == "download" ]; then
-            python "${PROJECT_DIR}/dukascopy-data-manager/dukascopy-data-manager.py" $1 "$symbol" $START_DATE --concurrent=3 --mode=$MODE
+        # Check for --only-absent flag and pass it to export command if present
+        echo "Debug: Checking for --only-absent in: $*"
+        if [[ "$*" == *"--only-absent"* ]]; then
+            echo "Debug: --only-absent flag detected in run.sh"
+            python "${PROJECT_DIR}/dukascopy-data-manager/dukascopy-data-manager.py" $1 "$symbol" $2 $START_DATE --only-absent --mode=$MODE $INCREMENTAL
         else
-            # Check for --only-absent flag and pass it to export command if present
-            echo "Debug: Checking for --only-absent in: $*"
-            if [[ "$*" == *"--only-absent"* ]]; then
-                echo "Debug: --only-absent flag detected in run.sh"
-                python "${PROJECT_DIR}/dukascopy-data-manager/dukascopy-data-manager.py" $1 "$symbol" $2 $START_DATE --only-absent --mode=$MODE
-            else
-                echo "Debug: --only-absent flag NOT detected in run.sh"
-                python "${PROJECT_DIR}/dukascopy-data-manager/dukascopy-data-manager.py" $1 "$symbol" $2 $START_DATE --mode=$MODE
-            fi
+            echo "Debug: --only-absent flag NOT detected in run.sh"
+            python "${PROJECT_DIR}/dukascopy-data-manager/dukascopy-data-manager.py" $1 "$symbol" $2 $START_DATE --mode=$MODE $INCREMENTAL
         fi
     done < "$SYMBOLS_FILE"
 fi
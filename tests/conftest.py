@@ -0,0 +1,37 @@
+"""Put the data manager modules and main.py on the import path of the tests"""
+import importlib
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).parent.parent
+MANAGER_DIR = ROOT / "dukascopy-data-manager"
+sys.path.insert(0, str(MANAGER_DIR))
+sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """An empty DATA_DIR"""
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def main_module(data_dir):
+    """main.py, imported once DATA_DIR is set"""
+    return importlib.import_module("main")
+
+
+
+@pytest.fixture
+def manager(data_dir, monkeypatch):
+    """The dukascopy-data-manager CLI module, with progress bars off"""
+    spec = importlib.util.spec_from_file_location("dukascopy_data_manager", MANAGER_DIR / "dukascopy-data-manager.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.SHOW_PROGRESS = False
+    # Importing loads .env, which may point DATA_DIR elsewhere
+    monkeypatch.setenv("DATA_DIR", str(data_dir))
+    return module
@@ -0,0 +1,68 @@
+import gc
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import bar_cache
+
+ROWS = 1000
+
+
+def load(symbol, timeframe, fmt, nocache):
+    index = pd.date_range("2024-01-01", periods=ROWS, freq="1min", name="date")
+    return pd.DataFrame({"close": np.arange(ROWS, dtype=np.float64)}, index=index)
+
+
+@pytest.fixture
+def server(tmp_path):
+    # Room for one series (dates and closes, 16 bytes a row) at a time
+    cache = bar_cache.BarCacheServer(load, lambda symbol, timeframe, fmt: 1, budget_bytes=ROWS * 16,
+                                     port=0, directory=tmp_path)
+    thread = threading.Thread(target=cache.serve_forever, daemon=True)
+    thread.start()
+    yield cache
+    cache.close()
+    thread.join()
+
+
+MAPS = Path("/proc/self/maps")
+
+
+def mapped_paths() -> set:
+    """Files mapped into this process (Linux)"""
+    fields = (line.split(maxsplit=5) for line in MAPS.read_text().splitlines())
+    return {parts[5].removesuffix(" (deleted)") for parts in fields if len(parts) == 6}
+
+
+def test_client_releases_evicted_series(server):
+    client = bar_cache.BarCacheClient(port=server.address[1])
+    try:
+        paths = []
+        for symbol in ("EURUSD", "GBPUSD", "USDJPY"):
+            client.bars(symbol, "1h")
+            paths.append(client.frames[(symbol, "1h", "csv")][0])
+        assert server.stats["evictions"] == 2
+        assert list(client.frames) == [("USDJPY", "1h", "csv")]
+
+        if MAPS.exists():
+            gc.collect()
+            mapped = mapped_paths()
+            assert paths[2] in mapped
+            assert not mapped & set(paths[:2])
+    finally:
+        client.close()
+
+
+def test_client_keeps_series_still_cached(server):
+    server.budget_bytes = 3 * ROWS * 16
+    client = bar_cache.BarCacheClient(port=server.address[1])
+    try:
+        first = client.bars("EURUSD", "1h")
+        client.bars("GBPUSD", "1h")
+        assert client.bars("EURUSD", "1h") is first
+        assert len(client.frames) == 2
+    finally:
+        client.close()
@@ -0,0 +1,139 @@
+import http.server
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+import downloader
+
+BODY = b"\x5d\x00\x00\x80\x00" + bytes(range(200))
+
+
+class StandIn(http.server.ThreadingHTTPServer):
+    """Local stand-in for the datafeed: each path answers its scripted responses in turn, repeating the last one.
+
+    A response is (status, body), ("sleep", seconds) before answering 200 with
+    BODY, or ("truncate", body) to announce body but close after half of it.
+    """
+    daemon_threads = True
+
+    def __init__(self, script):
+        self.script = {path: list(responses) for path, responses in script.items()}
+        self.requests = {}
+        self.lock = threading.Lock()
+        super().__init__(("127.0.0.1", 0), Handler)
+
+    def next_response(self, path):
+        with self.lock:
+            self.requests.setdefault(path, []).append(time.monotonic())
+            responses = self.script.get(path, [(404, b"")])
+            return responses.pop(0) if len(responses) > 1 else responses[0]
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        kind, value = self.server.next_response(self.path)
+        if kind == "sleep":
+            time.sleep(value)
+            kind, value = 200, BODY
+        if kind == "truncate":
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(value)))
+            self.end_headers()
+            self.wfile.write(value[:len(value) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.send_response(kind)
+        self.send_header("Content-Length", str(len(value)))
+        self.end_headers()
+        self.wfile.write(value)
+
+
+@pytest.fixture
+def stand_in():
+    servers = []
+
+    def start(script):
+        server = StandIn(script)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def no_partial_files(directory:Path) -> bool:
+    return not list(directory.rglob("*.part"))
+
+
+def test_server_errors_are_retried_with_backoff(stand_in, tmp_path):
+    server, url = stand_in({"/a.bi5": [(503, b""), (500, b""), (200, BODY)]})
+    with downloader.Downloader(concurrent=1, retries=3, backoff=0.05) as pool:
+        size = pool.download_file(tmp_path / "a.bi5", f"{url}/a.bi5")
+        assert pool.retry_count == 2
+    assert size == len(BODY)
+    assert (tmp_path / "a.bi5").read_bytes() == BODY
+    first, second, third = server.requests["/a.bi5"]
+    # Backoff doubles, with up to 100% jitter: 0.05-0.1s, then 0.1-0.2s
+    assert second - first >= 0.05
+    assert third - second >= 0.1
+
+
+def test_timeouts_are_retried(stand_in, tmp_path):
+    server, url = stand_in({"/a.bi5": [("sleep", 1.0), (200, BODY)]})
+    with downloader.Downloader(concurrent=1, retries=2, backoff=0.01, timeout=(1, 0.2)) as pool:
+        assert pool.download_file(tmp_path / "a.bi5", f"{url}/a.bi5") == len(BODY)
+        assert pool.retry_count == 1
+    assert len(server.requests["/a.bi5"]) == 2
+
+
+def test_retries_give_up_with_the_error(stand_in, tmp_path):
+    _, url = stand_in({"/a.bi5": [(502, b"")]})
+    with downloader.Downloader(concurrent=1, retries=1, backoff=0.01) as pool:
+        with pytest.raises(downloader.requests.HTTPError):
+            pool.download_file(tmp_path / "a.bi5", f"{url}/a.bi5")
+    assert not (tmp_path / "a.bi5").exists()
+
+
+def test_missing_and_empty_hours(stand_in, tmp_path):
+    _, url = stand_in({"/empty.bi5": [(200, b"")]})
+    empty = []
+    with downloader.Downloader(concurrent=1, retries=2, backoff=0.01) as pool:
+        # A 404 is not retried, and the caller records it as failed
+        assert pool.download_file(tmp_path / "missing.bi5", f"{url}/missing.bi5", on_empty=lambda: empty.append("missing")) is None
+        assert pool.download_file(tmp_path / "empty.bi5", f"{url}/empty.bi5", on_empty=lambda: empty.append("empty")) == 0
+        assert pool.retry_count == 0
+    assert empty == ["empty"]
+    assert not list(tmp_path.iterdir())
+
+
+def test_interrupted_transfers_leave_no_partial_file(stand_in, tmp_path):
+    _, url = stand_in({"/a.bi5": [("truncate", BODY)], "/b.bi5": [("truncate", BODY), (200, BODY)]})
+    with downloader.Downloader(concurrent=1, retries=1, backoff=0.01) as pool:
+        with pytest.raises(downloader.requests.RequestException):
+            pool.download_file(tmp_path / "a.bi5", f"{url}/a.bi5")
+        # A dropped transfer is retried like a dropped connection
+        assert pool.download_file(tmp_path / "b.bi5", f"{url}/b.bi5") == len(BODY)
+    assert not (tmp_path / "a.bi5").exists()
+    assert (tmp_path / "b.bi5").read_bytes() == BODY
+    assert no_partial_files(tmp_path)
+
+
+def test_submitted_downloads_use_the_base_url_hook(stand_in, tmp_path, monkeypatch):
+    _, url = stand_in({"/EURUSD/2024/00/02/10h_ticks.bi5": [(200, BODY)]})
+    monkeypatch.setattr(downloader, "BASE_URL", f"{url}/")
+    filename = tmp_path / "EURUSD" / "10h_ticks.bi5"
+    with downloader.Downloader(concurrent=2) as pool:
+        future = pool.submit(filename, f"{downloader.BASE_URL}EURUSD/2024/00/02/10h_ticks.bi5", symbol="EURUSD")
+        assert future.result() == len(BODY)
+    assert filename.read_bytes() == BODY
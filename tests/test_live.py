@@ -0,0 +1,120 @@
+import lzma
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import bars
+import bi5
+import live
+
+HOUR = datetime(2024, 1, 2, 10)
+NEXT_HOUR = HOUR + live.HOUR
+
+
+def hour_content(minutes) -> bytes:
+    """An hour file with one tick at the start of each of minutes"""
+    records = np.zeros(len(minutes), bi5.TICK_DTYPE)
+    records["TIME"] = [minute * 60_000 for minute in minutes]
+    records["BIDP"] = 110_000
+    records["ASKP"] = 110_002
+    records["BIDV"] = records["ASKV"] = 1.0
+    return lzma.compress(records.tobytes(), format=lzma.FORMAT_ALONE)
+
+
+class StubPool:
+    """Serves each hour's responses in turn, repeating the last one"""
+
+    def __init__(self, responses):
+        self.responses = {live.hour_url("EURUSD", hour): list(queue) for hour, queue in responses.items()}
+        self.requests = []
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def poll(self, url, etag=None, symbol=""):
+        self.requests.append(url)
+        queue = self.responses.get(url, [(404, None)])
+        status, content = queue.pop(0) if len(queue) > 1 else queue[0]
+        return status, content, f"etag-{len(self.requests)}" if content is not None else etag
+
+
+class Clock:
+    """Stands in for LiveTail.current_hour"""
+
+    def __init__(self, hour):
+        self.hour = hour
+
+    def __call__(self):
+        return self.hour
+
+
+def make_tail(monkeypatch, pool, grace=600):
+    clock = Clock(HOUR)
+    monkeypatch.setattr(live.LiveTail, "current_hour", staticmethod(clock))
+    return live.LiveTail(["EURUSD"], ["1m"], pool, capacity=200, grace=grace), clock
+
+
+def test_late_previous_hour_is_folded_in(monkeypatch):
+    pool = StubPool({
+        HOUR: [(404, None), (404, None), (200, hour_content(range(60))), (304, None)],
+        NEXT_HOUR: [(200, hour_content(range(5)))],
+    })
+    tail, clock = make_tail(monkeypatch, pool)
+    tail.poll_once()
+    clock.hour = NEXT_HOUR
+    # The previous hour's file is not published yet when the new hour starts
+    tail.poll_once()
+    assert len(tail.bars("EURUSD", "1m")) == 5
+
+    tail.poll_once()
+    frame = tail.bars("EURUSD", "1m")
+    assert len(frame) == 65
+    assert frame.index.is_monotonic_increasing
+    assert frame.index[0] == HOUR
+    assert (frame["tv"] == 1).all()
+
+    # Served unchanged, so the previous hour stops being polled
+    tail.poll_once()
+    assert [hour_file.hour for hour_file in tail.symbols["EURUSD"].files] == [NEXT_HOUR]
+    requests = len(pool.requests)
+    tail.poll_once()
+    assert pool.requests[requests:] == [live.hour_url("EURUSD", NEXT_HOUR)]
+
+
+def test_previous_hour_gains_ticks_after_the_boundary(monkeypatch):
+    pool = StubPool({
+        HOUR: [(200, hour_content(range(30))), (200, hour_content(range(60))), (200, hour_content(range(60)))],
+        NEXT_HOUR: [(200, hour_content(range(2)))],
+    })
+    tail, clock = make_tail(monkeypatch, pool)
+    tail.poll_once()
+    clock.hour = NEXT_HOUR
+    tail.poll_once()
+    tail.poll_once()
+    assert len(tail.bars("EURUSD", "1m")) == 62
+    # The same file served again counts as unchanged
+    assert [hour_file.hour for hour_file in tail.symbols["EURUSD"].files] == [NEXT_HOUR]
+
+
+def test_previous_hour_is_dropped_after_the_grace_period(monkeypatch):
+    pool = StubPool({NEXT_HOUR: [(200, hour_content(range(2)))]})
+    tail, clock = make_tail(monkeypatch, pool, grace=0)
+    tail.poll_once()
+    clock.hour = NEXT_HOUR
+    tail.poll_once()
+    assert [hour_file.hour for hour_file in tail.symbols["EURUSD"].files] == [NEXT_HOUR]
+
+
+def minute_bars(minutes) -> pd.DataFrame:
+    return pd.DataFrame({name: [pd.Timestamp(HOUR) + pd.Timedelta(minutes=minute) for minute in minutes]
+                         if name == "date" else [1.0] * len(minutes) for name in bars.COLUMNS})
+
+
+def test_ring_inserts_late_bars_in_order():
+    ring = live.BarRing(4)
+    ring.merge(minute_bars([0, 2, 3, 4]))
+    changed = ring.merge(minute_bars([1]))
+    assert [int(bar["date"]) for bar in changed] == [pd.Timestamp(HOUR + timedelta(minutes=1)).value]
+    assert list(ring.frame().index.minute) == [1, 2, 3, 4]
+    # Older than every bar a full ring keeps
+    assert ring.merge(minute_bars([0])) == []
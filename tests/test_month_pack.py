@@ -0,0 +1,38 @@
+import socket
+from datetime import datetime
+from pathlib import Path
+
+import downloader
+import inventory
+import month_pack
+from test_tick_cache import synthetic
+
+
+def closed_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_packed_hours_are_not_downloaded_again(manager, data_dir, monkeypatch):
+    download_path = f"{data_dir}/dukascopy_live/download/"
+    synthetic.generate(download_path, datetime(2024, 2, 1), datetime(2024, 2, 7), ["GBPUSD"], 20)
+    manager.pack(["GBPUSD"], workers=1)
+    asset_dir = Path(download_path) / "GBPUSD"
+    assert not list(asset_dir.rglob("*.bi5"))
+
+    with inventory.for_download_path(download_path) as inv:
+        recorded = inv.hours("GBPUSD", datetime(2024, 2, 1), datetime(2024, 2, 7))
+    packed = month_pack.read_pack(month_pack.month_dir(asset_dir, 2024, 2) / month_pack.PACK_NAME, 2024, 2)
+    present = {inventory.hour_key(date): hour.size for date, hour in packed.items() if hour.size}
+    assert {key: size for key, (status, size) in recorded.items() if status == inventory.PRESENT} == present
+
+    # Without the inventory, download finds the hours in the packs instead of fetching them
+    (Path(download_path) / inventory.FILE_NAME).unlink()
+    monkeypatch.setattr(downloader, "BASE_URL", f"http://127.0.0.1:{closed_port()}/")
+    manager.download(["GBPUSD"], "2024-02-01", end="2024-02-06", retries=0)
+    assert not list(asset_dir.rglob("*.bi5"))
+    with inventory.for_download_path(download_path) as inv:
+        statuses = {status for status, _ in inv.hours("GBPUSD", datetime(2024, 2, 1), datetime(2024, 2, 7)).values()}
+    assert inventory.FAILED not in statuses
+    assert inventory.PRESENT in statuses
@@ -0,0 +1,47 @@
+import pandas as pd
+
+import parquet_store
+
+
+def daily_bars(start, end) -> pd.DataFrame:
+    index = pd.date_range(start, end, freq="1D", name="date")
+    return pd.DataFrame({"open": 1.0, "high": 2.0, "low": 0.5, "close": 1.5}, index=index)
+
+
+def test_full_rebuild_drops_partitions_outside_the_new_range(main_module, tmp_path):
+    path = tmp_path / "EURUSD_resampled_1D.parquet"
+    main_module._write_resampled(daily_bars("2024-01-01", "2024-03-31"), path, "parquet")
+    main_module._write_resampled(daily_bars("2024-02-01", "2024-02-29"), path, "parquet")
+    df = parquet_store.read_dataset(path)
+    assert df.index.min() == pd.Timestamp("2024-02-01")
+    assert df.index.max() == pd.Timestamp("2024-02-29")
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def minute_ticks(start, periods) -> pd.DataFrame:
+    dates = pd.date_range(start, periods=periods, freq="1min")
+    return pd.DataFrame({"date": dates, "bid": 1.0, "ask": 1.0001})
+
+
+def test_appends_add_parts_and_compact_closed_months(tmp_path):
+    root = tmp_path / "EURUSD_1t.parquet"
+    days = [minute_ticks(pd.Timestamp("2024-01-29") + pd.Timedelta(days=day), 1440) for day in range(5)]
+    for day in days[:3]:
+        parquet_store.append_dataset(day, root)
+    january = root / "year=2024" / "month=01"
+    assert sorted(file.name for file in january.iterdir()) == ["part-0.parquet", "part-1.parquet", "part-2.parquet"]
+    # The first append to February closes January
+    for day in days[3:]:
+        parquet_store.append_dataset(day, root)
+    assert [file.name for file in january.iterdir()] == ["part-0.parquet"]
+    assert len(list((root / "year=2024" / "month=02").iterdir())) == 2
+
+    df = parquet_store.read_dataset(root)
+    expected = pd.concat(days, ignore_index=True)
+    assert len(df) == len(expected)
+    assert (df.index == expected["date"]).all()
+
+    # A rewrite of a partition leaves no appended parts behind
+    parquet_store.replace_tail(minute_ticks("2024-02-02", 10), root, pd.Timestamp("2024-02-02"))
+    assert [file.name for file in (root / "year=2024" / "month=02").iterdir()] == ["part-0.parquet"]
+    assert len(parquet_store.read_dataset(root, "2024-02-01")) == 1440 + 10
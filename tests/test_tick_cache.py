@@ -0,0 +1,36 @@
+import sys
+from datetime import datetime
+
+import pandas as pd
+
+from conftest import ROOT
+
+sys.path.insert(0, str(ROOT / "benchmarks"))
+import synthetic
+
+
+def write_tree(data_dir):
+    synthetic.generate(f"{data_dir}/dukascopy_live/download/", datetime(2024, 1, 25), datetime(2024, 3, 5),
+                       ["EURUSD"], 20)
+
+
+def test_partial_tick_cache_does_not_hide_the_1t_export(manager, main_module, data_dir):
+    write_tree(data_dir)
+    manager.export(["EURUSD"], "1t", "2024-01-25", end="2024-03-05")
+    # A later export of another timeframe writes the cache from its own, later start
+    manager.export(["EURUSD"], "15m", "2024-02-25", end="2024-03-05", write_tick_cache=True)
+
+    resampled_dir = main_module.get_paths()
+    assert main_module._tick_source(resampled_dir, "EURUSD").name == "EURUSD_1t.csv"
+    bars = main_module.get_price_df("EURUSD", verbose=False)
+    assert bars.index[0] < pd.Timestamp("2024-01-26")
+
+
+def test_tick_cache_covering_the_1t_export_is_used(manager, main_module, data_dir):
+    write_tree(data_dir)
+    manager.export(["EURUSD"], "1t", "2024-01-25", end="2024-03-05", write_tick_cache=True)
+
+    resampled_dir = main_module.get_paths()
+    assert main_module._tick_source(resampled_dir, "EURUSD").name == "EURUSD_ticks"
+    from_cache = main_module.get_price_df("EURUSD", verbose=False)
+    assert from_cache.index[0] < pd.Timestamp("2024-01-26")